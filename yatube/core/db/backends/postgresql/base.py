@@ -0,0 +1,11 @@
+from django.db.backends.postgresql import base
+
+from core.db.pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        # соединение из пула могло быть открыто другим потоком
+        self.isolation_level = connection.isolation_level
+        return connection
@@ -0,0 +1,237 @@
+"""
+Постоянные соединения с базой и пул соединений процесса.
+
+Бэкенды core.db.backends.* — стандартные бэкенды Django с
+PooledConnectionMixin. Постоянные соединения включает CONN_MAX_AGE;
+при CONN_HEALTH_CHECKS соединение, оставшееся от прошлого ответа,
+проверяется запросом SELECT 1 перед первым использованием в новом
+ответе, и разорванное соединение открывается заново, а не отдаёт
+ошибку посетителю (как CONN_HEALTH_CHECKS в Django 4.1).
+
+Если в настройках базы задан POOL с SIZE > 0, закрытое соединение не
+закрывается, а возвращается в пул процесса, и следующий поток или
+ответ получает его без нового подключения. SIZE ограничивает число
+соединений процесса — выданных и свободных; когда все заняты, поток
+ждёт освобождения не дольше TIMEOUT секунд. MIN соединений открывается
+заранее при первом обращении к пулу, свободные соединения старше
+IDLE_TIMEOUT секунд закрываются. После fork пул родителя не
+используется: у каждого процесса gunicorn свой пул.
+"""
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.db import OperationalError
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolExhausted(OperationalError):
+    pass
+
+
+def ping(raw):
+    cursor = raw.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    finally:
+        cursor.close()
+
+
+def discard(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, size, min_size=0, idle_timeout=300, timeout=30,
+                 health_checks=True):
+        self.size = size
+        self.min_size = min(min_size, size)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.health_checks = health_checks
+        # свободные соединения: (соединение, когда возвращено)
+        self.idle = deque()
+        self.opened = 0
+        self.warmed = False
+        self.condition = threading.Condition()
+
+    def acquire(self, connect):
+        """
+        Свободное соединение пула или новое от connect(), если лимит
+        не исчерпан.
+        """
+        if not self.warmed:
+            self.warm(connect)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            raw = self.checkout(deadline)
+            if raw is None:
+                break
+            if not self.health_checks:
+                return raw
+            try:
+                ping(raw)
+                return raw
+            except Exception:
+                self.drop(raw)
+        try:
+            return connect()
+        except BaseException:
+            with self.condition:
+                self.opened -= 1
+                self.condition.notify()
+            raise
+
+    def checkout(self, deadline):
+        """
+        Свободное соединение или None, если под новое соединение
+        занято место в пуле.
+        """
+        with self.condition:
+            self.expire()
+            while not self.idle and self.opened >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(
+                        f'Все {self.size} соединений пула заняты'
+                    )
+                self.condition.wait(remaining)
+            if not self.idle:
+                self.opened += 1
+                return None
+            raw, _ = self.idle.pop()
+            return raw
+
+    def release(self, raw):
+        try:
+            # незавершённая транзакция не должна достаться следующему
+            raw.rollback()
+        except Exception:
+            self.drop(raw)
+            return
+        with self.condition:
+            self.idle.append((raw, time.monotonic()))
+            self.condition.notify()
+
+    def drop(self, raw):
+        """Закрывает соединение и освобождает его место в пуле."""
+        discard(raw)
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+    def expire(self):
+        """Закрывает давно свободные соединения сверх MIN."""
+        limit = time.monotonic() - self.idle_timeout
+        while (
+            self.idle and self.idle[0][1] < limit
+            and self.opened > self.min_size
+        ):
+            raw, _ = self.idle.popleft()
+            discard(raw)
+            self.opened -= 1
+
+    def warm(self, connect):
+        with self.condition:
+            self.warmed = True
+            missing = self.min_size - self.opened
+            self.opened += missing
+        for _ in range(missing):
+            try:
+                raw = connect()
+            except Exception:
+                with self.condition:
+                    self.opened -= 1
+                continue
+            self.release(raw)
+
+    def close(self):
+        with self.condition:
+            while self.idle:
+                raw, _ = self.idle.pop()
+                discard(raw)
+                self.opened -= 1
+
+
+def get_pool(alias, options, health_checks=True):
+    """Пул базы alias текущего процесса; после fork создаётся новый."""
+    key = (os.getpid(), alias)
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            for other in [key for key in pools if key[0] != os.getpid()]:
+                # соединения родителя закрывает родитель
+                del pools[other]
+            pool = pools[key] = ConnectionPool(
+                size=int(options['SIZE']),
+                min_size=int(options.get('MIN', 0)),
+                idle_timeout=float(options.get('IDLE_TIMEOUT', 300)),
+                timeout=float(options.get('TIMEOUT', 30)),
+                health_checks=health_checks,
+            )
+        return pool
+
+
+def close_pools():
+    with pools_lock:
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
+
+
+class PooledConnectionMixin:
+    health_check_done = False
+
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('SIZE'):
+            return None
+        in_memory = getattr(self, 'is_in_memory_db', None)
+        if in_memory is not None and in_memory():
+            # у каждого подключения к базе в памяти своя база
+            return None
+        return get_pool(
+            self.alias, options, self.settings_dict.get('CONN_HEALTH_CHECKS')
+        )
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        pool = self.pool()
+        if pool is None:
+            return connect()
+        return pool.acquire(connect)
+
+    def _close(self):
+        pool = self.pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        if self.errors_occurred or self.in_atomic_block:
+            pool.drop(self.connection)
+        else:
+            pool.release(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # вызывается в начале и в конце ответа
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            if not self.is_usable():
+                # такое соединение не возвращается в пул
+                self.errors_occurred = True
+                self.close()
+        self.health_check_done = True
+        super().ensure_connection()
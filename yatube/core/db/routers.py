@@ -0,0 +1,100 @@
+"""
+Чтение из реплик базы.
+
+ReplicaRoutingMiddleware направляет чтение GET- и HEAD-запросов к
+представлениям DB_REPLICA_VIEWS в одну из реплик DATABASE_REPLICAS,
+выбранную случайно на время ответа; запись, миграции и остальные
+представления работают с основной базой. Если за время ответа что-то
+записано в базу, посетитель получает cookie DB_REPLICA_STICKY_COOKIE и
+DB_REPLICA_STICKY_SECONDS секунд читает из основной базы — так автор
+сразу видит свою запись, даже если реплика отстаёт. Служебные записи
+приложений DB_REPLICA_UNTRACKED_APPS (kvstore миниатюр, сессии) cookie
+не ставят: иначе его получал бы, например, любой посетитель, которому
+досталась карточка с новой миниатюрой, и страница не попадала бы в кеш.
+
+Страница кеша (posts.cache), собранная по реплике, хранится под своим
+ключом и только DB_REPLICA_PAGE_CACHE_TIMEOUT секунд: отставшая реплика
+может ещё не знать о записи, которая уже сменила поколение в ключе.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+routing = ContextVar('routing', default=None)
+
+
+class Routing:
+    """Состояние ответа: выбранная реплика и была ли запись."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def replica_reads():
+    """Читает ли текущий ответ из реплики."""
+    state = routing.get()
+    return state is not None and state.replica is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is not None and state.replica:
+            return state.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if (
+            state is not None
+            and model._meta.app_label not in settings.DB_REPLICA_UNTRACKED_APPS
+        ):
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = request.db_routing = Routing()
+        token = routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                settings.DB_REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in settings.DB_REPLICA_VIEWS
+            and settings.DB_REPLICA_STICKY_COOKIE not in request.COOKIES
+        ):
+            request.db_routing.replica = random.choice(
+                settings.DATABASE_REPLICAS
+            )
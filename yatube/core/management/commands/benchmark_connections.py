@@ -0,0 +1,112 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.urls import reverse
+
+from core.db.pool import close_pools
+
+MODES = {
+    # закрывать соединение после каждого ответа
+    'close': {'CONN_MAX_AGE': 0, 'POOL': {'SIZE': 0}},
+    # постоянное соединение у каждого потока
+    'persistent': {'CONN_MAX_AGE': 60, 'POOL': {'SIZE': 0}},
+    # соединение возвращается в пул процесса после каждого ответа
+    'pool': {'CONN_MAX_AGE': 0, 'POOL': {'SIZE': None}},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность (ответов в секунду) при закрытии '
+        'соединений с базой после каждого ответа, с постоянными '
+        'соединениями и с пулом соединений. Используется база '
+        'из настроек.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=None,
+            help='Адрес страницы, по умолчанию главная.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько ответов получить в каждом режиме.'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Сколько потоков отправляют запросы одновременно.'
+        )
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=list(MODES),
+            help='Какие режимы замерять.'
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кеш между запросами.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('posts:index')
+        settings_dict = connections.databases[DEFAULT_DB_ALIAS]
+        saved = {
+            'CONN_MAX_AGE': settings_dict['CONN_MAX_AGE'],
+            'POOL': settings_dict.get('POOL'),
+        }
+        try:
+            for mode in options['modes']:
+                settings_dict.update(MODES[mode])
+                if mode == 'pool':
+                    settings_dict['POOL'] = {
+                        **(saved['POOL'] or {}), 'SIZE': options['threads']
+                    }
+                rate = self.measure(
+                    path, options['requests'], options['threads'],
+                    options['warm']
+                )
+                self.stdout.write(f'{mode:<12} {rate:8.1f} ответов/с')
+        finally:
+            settings_dict.update(saved)
+            close_pools()
+
+    def measure(self, path, requests, threads, warm):
+        counts = [requests // threads] * threads
+        counts[0] += requests % threads
+        errors = []
+        connections.close_all()
+        started = time.perf_counter()
+        if threads == 1:
+            self.work(path, requests, warm, errors)
+        else:
+            workers = [
+                threading.Thread(
+                    target=self.work, args=(path, count, warm, errors)
+                )
+                for count in counts
+            ]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        elapsed = time.perf_counter() - started
+        close_pools()
+        if errors:
+            raise errors[0]
+        return requests / elapsed
+
+    def work(self, path, count, warm, errors):
+        client = Client()
+        try:
+            for _ in range(count):
+                if not warm:
+                    cache.clear()
+                status = client.get(path).status_code
+                if status != 200:
+                    raise CommandError(f'{path}: ответ {status}')
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections.close_all()
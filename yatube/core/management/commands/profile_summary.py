@@ -0,0 +1,83 @@
+import os
+import pstats
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import dumps
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка по отчётам SamplingProfilerMiddleware: самые горячие '
+        'функции по снимкам стеков и по статистике cProfile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=None,
+            help='Каталог отчётов (по умолчанию PROFILER_DIR).'
+        )
+        parser.add_argument(
+            '--view', default=None,
+            help='Только отчёты этого представления, например posts:index.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько функций показать.'
+        )
+        parser.add_argument(
+            '--sort', default='cumulative', choices=['cumulative', 'tottime'],
+            help='Порядок для статистики cProfile.'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILER_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(f'Нет каталога отчётов {directory}.')
+        view = options['view']
+        marker = f'-{view.replace(":", "_")}-' if view else ''
+        collapsed = [
+            path for path in dumps(directory, '.collapsed') if marker in path
+        ]
+        profiles = [
+            path for path in dumps(directory, '.pstats') if marker in path
+        ]
+        self.stdout.write(f'Отчётов: {len(collapsed)}, cProfile: '
+                          f'{len(profiles)}')
+        if collapsed:
+            self.summarize_samples(collapsed, options['limit'])
+        if profiles:
+            output = StringIO()
+            stats = pstats.Stats(*profiles, stream=output)
+            stats.sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write(output.getvalue())
+
+    def summarize_samples(self, paths, limit):
+        """Доля снимков, в которых функция выполнялась сама и в стеке."""
+        own = Counter()
+        inclusive = Counter()
+        total = 0
+        for path in paths:
+            with open(path) as stream:
+                for line in stream:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if not stack:
+                        continue
+                    count = int(count)
+                    frames = stack.split(';')
+                    total += count
+                    own[frames[-1]] += count
+                    for frame in set(frames):
+                        inclusive[frame] += count
+        if not total:
+            return
+        self.stdout.write(f'Снимков стека: {total}')
+        self.stdout.write('Сама функция:')
+        for frame, count in own.most_common(limit):
+            self.stdout.write(f'{count / total:7.1%}  {frame}')
+        self.stdout.write('С вызванными функциями:')
+        for frame, count in inclusive.most_common(limit):
+            self.stdout.write(f'{count / total:7.1%}  {frame}')
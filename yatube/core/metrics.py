@@ -0,0 +1,329 @@
+"""
+Счётчики и гистограммы в памяти процесса и их вывод для Prometheus.
+
+Без METRICS_DIR значения видит только процесс, который отвечает на
+/metrics. С несколькими процессами gunicorn каждый процесс раз
+в METRICS_FLUSH_INTERVAL секунд из фонового потока атомарно переписывает
+свой файл METRICS_DIR/<pid>-<метка>.json (метка своя у каждого процесса,
+поэтому процесс с повторно выданным pid не затирает чужой файл),
+а /metrics складывает файлы всех процессов: счётчики и корзины
+гистограмм суммируются. Файлы завершившихся процессов /metrics переносит
+в totals.json и удаляет — их значения продолжают входить в суммы,
+как у счётчиков Prometheus. Процессы проверяются по pid, поэтому
+каталог должен быть общим только для процессов одной машины.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.files import locks
+
+logger = logging.getLogger(__name__)
+
+TOTALS_NAME = 'totals'
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.register(self)
+
+    def key(self, labels):
+        return json.dumps([str(labels[name]) for name in self.labelnames])
+
+    def describe(self):
+        return {
+            'type': self.type, 'help': self.help, 'labels': self.labelnames
+        }
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        registry.changed()
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with registry.lock:
+            # [по корзине (не накопительно)..., +Inf, сумма]
+            state = self.values.setdefault(
+                key, [0] * (len(self.buckets) + 1) + [0.0]
+            )
+            state[bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+        registry.changed()
+
+    def describe(self):
+        return {**super().describe(), 'buckets': self.buckets}
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        # файл завершившегося процесса мог остаться недописанным
+        return None
+
+
+def write_snapshot(path, snapshot):
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as stream:
+        json.dump(snapshot, stream)
+    os.replace(temporary, path)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        # pid процесса, в котором запущен поток записи, и метка файла
+        self.flusher_pid = None
+        self.pid = None
+        self.token = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {
+                    **metric.describe(),
+                    'values': {
+                        key: list(value) if isinstance(value, list) else value
+                        for key, value in metric.values.items()
+                    },
+                }
+                for name, metric in self.metrics.items()
+            }
+
+    def changed(self):
+        """Запускает поток записи файла; сам ответ файл не пишет."""
+        if settings.METRICS_DIR and self.flusher_pid != os.getpid():
+            self.start_flusher()
+
+    def start_flusher(self):
+        with self.lock:
+            # после fork поток родителя в дочернем процессе не работает
+            if self.flusher_pid == os.getpid():
+                return
+            if self.flusher_pid is None:
+                atexit.register(self.flush_on_exit)
+            self.flusher_pid = os.getpid()
+        threading.Thread(
+            target=self.run_flusher, name='metrics-flush', daemon=True
+        ).start()
+
+    def run_flusher(self):
+        while settings.METRICS_DIR:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('Не удалось записать метрики процесса')
+        with self.lock:
+            self.flusher_pid = None
+
+    def flush_on_exit(self):
+        if settings.METRICS_DIR and self.flusher_pid == os.getpid():
+            self.flush()
+
+    def path(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.token = uuid.uuid4().hex[:8]
+        return os.path.join(
+            settings.METRICS_DIR, f'{self.pid}-{self.token}.json'
+        )
+
+    def flush(self):
+        """Переписывает файл процесса в METRICS_DIR."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        write_snapshot(self.path(), self.snapshot())
+
+    def merge(self, total, snapshot):
+        """Добавляет значения snapshot к total (оба — из snapshot())."""
+        for name, data in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            values = total.setdefault(name, {**data, 'values': {}})['values']
+            for key, value in data['values'].items():
+                values[key] = metric.merge(values.get(key), value)
+        return total
+
+    def prune(self, directory):
+        """Переносит файлы завершившихся процессов в totals.json."""
+        dead = []
+        for name in os.listdir(directory):
+            stem, extension = os.path.splitext(name)
+            pid = stem.split('-')[0]
+            if extension == '.json' and pid.isdigit() and (
+                not process_alive(int(pid))
+            ):
+                dead.append(name)
+        if not dead:
+            return
+        totals_path = os.path.join(directory, f'{TOTALS_NAME}.json')
+        with open(os.path.join(directory, f'{TOTALS_NAME}.lock'), 'a') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                totals = read_snapshot(totals_path) or {}
+                merged = []
+                for name in dead:
+                    path = os.path.join(directory, name)
+                    if not os.path.exists(path):
+                        # уже перенёс другой процесс
+                        continue
+                    snapshot = read_snapshot(path)
+                    if snapshot is not None:
+                        self.merge(totals, snapshot)
+                    merged.append(path)
+                write_snapshot(totals_path, totals)
+                for path in merged:
+                    os.remove(path)
+            finally:
+                locks.unlock(lock)
+
+    def snapshots(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            return [self.snapshot()]
+        self.flush()
+        self.prune(directory)
+        snapshots = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            snapshot = read_snapshot(os.path.join(directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def collect(self):
+        """Сумма значений всех процессов: {имя: {метки: значение}}."""
+        merged = {}
+        for snapshot in self.snapshots():
+            self.merge(merged, snapshot)
+        return {name: data['values'] for name, data in merged.items()}
+
+    def render(self):
+        """Текстовый формат Prometheus (version 0.0.4)."""
+        lines = []
+        collected = self.collect()
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for key, value in sorted(collected.get(name, {}).items()):
+                labels = list(zip(metric.labelnames, json.loads(key)))
+                if metric.type == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                bounds = [*map(str, metric.buckets), '+Inf']
+                for bound, count in zip(bounds, value):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{format_labels(labels + [("le", bound)])} '
+                        f'{cumulative}'
+                    )
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-1]}')
+                lines.append(
+                    f'{name}_count{format_labels(labels)} {cumulative}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+registry = Registry()
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по имени представления.', ['view'],
+)
+DB_DURATION = Histogram(
+    'yatube_db_duration_seconds',
+    'Время запросов к базе за ответ по имени представления.', ['view'],
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries_total',
+    'Запросы к базе по имени представления.', ['view'],
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кешу страниц и карточек по префиксу ключа.',
+    ['prefix', 'result'],
+)
+CARD_RENDER_SECONDS = Counter(
+    'yatube_card_render_seconds_total',
+    'Время отрисовки карточек записей: потраченное при промахе кеша '
+    '(spent) и сэкономленное попаданием (saved).', ['result'],
+)
+THUMBNAIL_DURATION = Histogram(
+    'yatube_thumbnail_duration_seconds',
+    'Время фоновой подготовки миниатюр и вариантов картинок.', ['job'],
+)
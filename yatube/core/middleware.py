@@ -0,0 +1,147 @@
+"""
+Замеры запросов к базе и отрисовки шаблонов.
+
+QueryMetricsMiddleware стоит первым в MIDDLEWARE и через
+connection.execute_wrapper считает запросы всех подключений за время
+ответа: количество, суммарное время и повторы — одинаковый SQL
+(с плейсхолдерами вместо параметров), выполненный больше одного раза,
+обычно означает N+1. Время шаблонов собирает бэкенд
+core.template_backends.DjangoTemplates; запросы из ленивых querysets,
+выполненные во время отрисовки, входят в оба времени.
+
+Итог пишется в лог yatube.metrics одной JSON-строкой и, если включён
+SERVER_TIMING, в заголовок Server-Timing. Для представлений из
+QUERY_BUDGETS превышение числа запросов пишется в лог предупреждением,
+а при QUERY_BUDGET_MODE='raise' (для тестов) — исключением. Время
+ответов и запросов к базе попадает и в гистограммы core.metrics.
+Запросы фоновых задач, выполненных в потоке ответа (background_queries),
+считаются во всех замерах, но не в бюджете: обычно такие задачи идут
+в отдельных потоках.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics as prometheus
+
+logger = logging.getLogger('yatube.metrics')
+background = ContextVar('metrics_background', default=False)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def background_queries():
+    """Запросы внутри блока не входят в бюджет представления."""
+    token = background.set(True)
+    try:
+        yield
+    finally:
+        background.reset(token)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        # из них выполнены фоновыми задачами (background_queries)
+        self.background_queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        # глубина вложенных отрисовок: считается только внешняя
+        self.template_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if background.get():
+            self.background_queries += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный SQL."""
+        return sum(count - 1 for count in self.fingerprints.values())
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.queries} queries, {self.duplicates()} duplicate"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def fingerprint(sql):
+    return hashlib.sha1(' '.join(sql.split()).encode()).hexdigest()[:12]
+
+
+class QueryMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else None
+        self.log(request, response, view, metrics, total)
+        self.observe(view or 'unresolved', metrics, total)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(total)
+        self.check_budget(view, metrics)
+        return response
+
+    def log(self, request, response, view, metrics, total):
+        record = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'background_queries': metrics.background_queries,
+            'duplicates': metrics.duplicates(),
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        repeated = [
+            {'fingerprint': key, 'count': count}
+            for key, count in metrics.fingerprints.most_common()
+            if count > 1
+        ]
+        if repeated:
+            record['repeated'] = repeated
+        logger.info(json.dumps(record), extra={'metrics': record})
+
+    def observe(self, view, metrics, total):
+        prometheus.REQUEST_DURATION.observe(total, view=view)
+        prometheus.DB_DURATION.observe(metrics.sql_time, view=view)
+        prometheus.DB_QUERIES.inc(metrics.queries, view=view)
+
+    def check_budget(self, view, metrics):
+        budget = settings.QUERY_BUDGETS.get(view)
+        queries = metrics.queries - metrics.background_queries
+        if budget is None or queries <= budget:
+            return
+        message = f'{view}: {queries} запросов к базе при бюджете {budget}'
+        if settings.QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
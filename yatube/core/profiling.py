@@ -0,0 +1,154 @@
+"""
+Профилирование медленных запросов.
+
+SamplingProfilerMiddleware включается PROFILER_ENABLED. Пока запрос
+выполняется, общий для процесса поток раз в PROFILER_INTERVAL_MS снимает
+стек потока запроса (sys._current_frames) — это почти ничего не стоит,
+поэтому так профилируются все запросы. Доля PROFILER_SAMPLE_RATE
+запросов, выбранных заранее, дополнительно выполняется под cProfile.
+
+Отчёт сохраняется, если запрос выполнялся дольше PROFILER_SLOW_MS или
+был выбран для cProfile: стеки в свёрнутом формате для flamegraph
+(.collapsed) и, для cProfile, статистика pstats (.pstats). Имя файла
+содержит время, представление, число запросов к базе и длительность;
+в каталоге PROFILER_DIR хранятся только PROFILER_MAX_DUMPS последних
+отчётов. Сводку по отчётам печатает команда profile_summary.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+UNSAFE_RE = re.compile(r'[^\w.-]+')
+
+
+def frame_name(code):
+    path = code.co_filename.replace(os.sep, '/').split('/')
+    return f'{code.co_name} ({"/".join(path[-2:])}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Поток, который собирает стеки зарегистрированных потоков."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.active = threading.Event()
+        self.thread = None
+
+    def start(self, thread_id):
+        with self.lock:
+            self.samples[thread_id] = Counter()
+            self.active.set()
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='profiler', daemon=True
+                )
+                self.thread.start()
+
+    def stop(self, thread_id):
+        """Снимает поток с наблюдения; возвращает Counter стеков."""
+        with self.lock:
+            samples = self.samples.pop(thread_id, Counter())
+            if not self.samples:
+                self.active.clear()
+        return samples
+
+    def run(self):
+        while True:
+            self.active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, samples in self.samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self.stack(frame)] += 1
+
+    @staticmethod
+    def stack(frame):
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+class SamplingProfilerMiddleware:
+    sampler = None
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if SamplingProfilerMiddleware.sampler is None:
+            SamplingProfilerMiddleware.sampler = StackSampler(
+                settings.PROFILER_INTERVAL_MS / 1000
+            )
+
+    def __call__(self, request):
+        thread_id = threading.get_ident()
+        profile = None
+        if random.random() < settings.PROFILER_SAMPLE_RATE:
+            profile = cProfile.Profile()
+        self.sampler.start(thread_id)
+        started = time.perf_counter()
+        try:
+            if profile is not None:
+                response = profile.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            samples = self.sampler.stop(thread_id)
+        duration = (time.perf_counter() - started) * 1000
+        if profile is not None or duration >= settings.PROFILER_SLOW_MS:
+            self.dump(request, duration, samples, profile)
+        return response
+
+    def dump(self, request, duration, samples, profile):
+        directory = settings.PROFILER_DIR
+        os.makedirs(directory, exist_ok=True)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics = getattr(request, 'metrics', None)
+        queries = metrics.queries if metrics is not None else 0
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        stamp += f'.{int(now * 1000) % 1000:03d}'
+        base = os.path.join(directory, UNSAFE_RE.sub('_', (
+            f'{stamp}-{os.getpid()}-{threading.get_ident()}-{view}-'
+            f'{queries}q-{duration:.0f}ms'
+        )))
+        with open(base + '.collapsed', 'w') as stream:
+            for stack, count in samples.most_common():
+                stream.write(f'{stack} {count}\n')
+        if profile is not None:
+            profile.dump_stats(base + '.pstats')
+        rotate(directory, settings.PROFILER_MAX_DUMPS)
+
+
+def dumps(directory, extension):
+    names = [
+        name for name in os.listdir(directory) if name.endswith(extension)
+    ]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def rotate(directory, keep):
+    """Оставляет keep последних отчётов (по времени в имени)."""
+    reports = dumps(directory, '.collapsed')
+    for path in reports[:max(len(reports) - keep, 0)]:
+        base = path[:-len('.collapsed')]
+        for name in (path, base + '.pstats'):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
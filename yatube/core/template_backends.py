@@ -0,0 +1,33 @@
+import time
+
+from django.template.backends import django as django_backend
+
+
+class Template(django_backend.Template):
+    """Шаблон, время отрисовки которого попадает в request.metrics."""
+
+    def render(self, context=None, request=None):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return super().render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates с замером времени для core.middleware."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django_backend.TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
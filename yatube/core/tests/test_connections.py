@@ -0,0 +1,111 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from core.db.backends.sqlite3.base import DatabaseWrapper
+from core.db.pool import ConnectionPool, PoolExhausted, close_pools
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'pool.sqlite3')
+        self.opened = 0
+
+    def connect(self):
+        self.opened += 1
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def test_released_connection_is_reused(self):
+        pool = ConnectionPool(size=2)
+        raw = pool.acquire(self.connect)
+        pool.release(raw)
+        self.assertIs(pool.acquire(self.connect), raw)
+        self.assertEqual(self.opened, 1)
+
+    def test_size_limit(self):
+        pool = ConnectionPool(size=1, timeout=0.05)
+        pool.acquire(self.connect)
+        with self.assertRaises(PoolExhausted):
+            pool.acquire(self.connect)
+
+    def test_warm_and_idle_timeout(self):
+        """MIN соединений открывается заранее, лишние свободные закрываются"""
+        pool = ConnectionPool(size=3, min_size=2, idle_timeout=0)
+        taken = [pool.acquire(self.connect)]
+        self.assertEqual(self.opened, 2)
+        taken += [pool.acquire(self.connect), pool.acquire(self.connect)]
+        self.assertEqual(self.opened, 3)
+        for raw in taken:
+            pool.release(raw)
+        pool.acquire(self.connect)
+        self.assertEqual(pool.opened, 2)
+        self.assertEqual(len(pool.idle), 1)
+
+    def test_broken_connection_is_replaced(self):
+        pool = ConnectionPool(size=1)
+        raw = pool.acquire(self.connect)
+        pool.release(raw)
+        raw.close()
+        fresh = pool.acquire(self.connect)
+        self.assertIsNot(fresh, raw)
+        self.assertEqual(pool.opened, 1)
+
+
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(close_pools)
+        self.settings_dict = {
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'wrapper.sqlite3'),
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False, 'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': {'SIZE': 2},
+        }
+
+    def wrapper(self):
+        return DatabaseWrapper(self.settings_dict, alias='pool_test')
+
+    def test_closed_connection_returns_to_pool(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+        second.close()
+
+    def test_health_check_reconnects(self):
+        """Разорванное постоянное соединение заменяется в новом ответе"""
+        self.settings_dict['CONN_MAX_AGE'] = 60
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(wrapper, 'is_usable', return_value=False):
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        self.assertIsNot(wrapper.connection, raw)
+        wrapper.close()
+
+
+class BenchmarkConnectionsTest(TestCase):
+    def test_reports_each_mode(self):
+        out = StringIO()
+        call_command(
+            'benchmark_connections', requests=2, threads=1, stdout=out
+        )
+        for mode in ('close', 'persistent', 'pool'):
+            self.assertIn(mode, out.getvalue())
@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import Histogram, REQUEST_DURATION, registry
+from posts.cache import ALL, bump
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsEndpointTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        Post.objects.create(author=cls.user, text='Тестовая запись')
+
+    def setUp(self):
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def value(self, text, line_start):
+        for line in text.splitlines():
+            if line.startswith(line_start + ' '):
+                return float(line.split()[-1])
+        return 0.0
+
+    def test_metrics_are_protected(self):
+        """Метрики доступны по токену и сотрудникам"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 403)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_page_cache_and_latency_are_counted(self):
+        """Попадания в кеш страниц и время ответов попадают в метрики"""
+        hit = 'yatube_cache_requests_total{prefix="index_page",result="hit"}'
+        miss = (
+            'yatube_cache_requests_total{prefix="index_page",result="miss"}'
+        )
+        latency = 'yatube_request_duration_seconds_count{view="posts:index"}'
+        before = self.scrape()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        after = self.scrape()
+        self.assertEqual(self.value(after, miss) - self.value(before, miss), 1)
+        self.assertEqual(self.value(after, hit) - self.value(before, hit), 1)
+        self.assertEqual(
+            self.value(after, latency) - self.value(before, latency), 2
+        )
+        self.assertIn('# TYPE yatube_thumbnail_duration_seconds histogram',
+                      after)
+
+    def test_card_render_time_is_counted(self):
+        """Время отрисовки карточек и сэкономленное кешем — в метриках"""
+        spent = 'yatube_card_render_seconds_total{result="spent"}'
+        saved = 'yatube_card_render_seconds_total{result="saved"}'
+        before = self.scrape()
+        self.client.get(reverse('posts:index'))
+        # страница собирается заново, карточка берётся из кеша
+        bump(ALL)
+        self.client.get(reverse('posts:index'))
+        after = self.scrape()
+        self.assertGreater(self.value(after, spent), self.value(before, spent))
+        self.assertGreater(self.value(after, saved), self.value(before, saved))
+
+
+class MetricsRegistryTest(TestCase):
+    def test_histogram_exposition(self):
+        """Корзины гистограммы выводятся накопительно"""
+        histogram = Histogram(
+            'test_duration_seconds', 'Тест.', ['job'], buckets=(0.1, 1)
+        )
+        self.addCleanup(registry.metrics.pop, histogram.name)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, job='a"b')
+        text = registry.render()
+        self.assertIn('test_duration_seconds_bucket{job="a\\"b",le="0.1"} 2',
+                      text)
+        self.assertIn('test_duration_seconds_bucket{job="a\\"b",le="1"} 3',
+                      text)
+        self.assertIn('test_duration_seconds_bucket{job="a\\"b",le="+Inf"} 4',
+                      text)
+        self.assertIn('test_duration_seconds_count{job="a\\"b"} 4', text)
+
+    def test_processes_are_summed(self):
+        """В многопроцессном режиме значения процессов складываются"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            REQUEST_DURATION.observe(0.2, view='test:view')
+            own = registry.snapshot()
+            with open(os.path.join(directory, '1.json'), 'w') as stream:
+                json.dump(own, stream)
+            text = registry.render()
+        count = 'yatube_request_duration_seconds_count{view="test:view"}'
+        line = next(
+            line for line in text.splitlines() if line.startswith(count)
+        )
+        self.assertEqual(line.split()[-1], '2')
+
+    def test_finished_processes_are_merged(self):
+        """Файлы завершившихся процессов переносятся в totals.json"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        with override_settings(METRICS_DIR=directory):
+            REQUEST_DURATION.observe(0.2, view='test:dead')
+            own = registry.snapshot()
+            for token in ('first', 'second'):
+                name = f'{process.pid}-{token}.json'
+                with open(os.path.join(directory, name), 'w') as stream:
+                    json.dump(own, stream)
+            registry.render()
+            text = registry.render()
+        self.assertEqual(
+            sorted(name for name in os.listdir(directory)
+                   if name.endswith('.json')),
+            sorted([os.path.basename(registry.path()), 'totals.json'])
+        )
+        count = 'yatube_request_duration_seconds_count{view="test:dead"}'
+        line = next(
+            line for line in text.splitlines() if line.startswith(count)
+        )
+        self.assertEqual(line.split()[-1], '3')
+
+    def test_request_path_does_not_write_files(self):
+        """Файл процесса пишет фоновый поток, а не обновление метрики"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(
+            METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=60
+        ):
+            REQUEST_DURATION.observe(0.2, view='test:view')
+            self.assertEqual(os.listdir(directory), [])
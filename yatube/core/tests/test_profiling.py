@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.profiling import StackSampler
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SamplingProfilerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = User.objects.create_user(username='testuser')
+        Post.objects.create(author=user, text='Тестовая запись')
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def get(self, url, **profiler):
+        with override_settings(
+            PROFILER_ENABLED=True, PROFILER_DIR=self.directory, **profiler
+        ):
+            # цепочку middleware клиент собирает при первом запросе
+            return Client().get(url)
+
+    def test_slow_requests_are_dumped_with_rotation(self):
+        """Медленные запросы сохраняются, хранятся последние отчёты"""
+        for _ in range(3):
+            self.get(
+                reverse('posts:index'),
+                PROFILER_SLOW_MS=0, PROFILER_MAX_DUMPS=2
+            )
+        names = sorted(os.listdir(self.directory))
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(
+            '-posts_index-' in name and name.endswith('.collapsed')
+            for name in names
+        ))
+
+    def test_fast_requests_are_not_dumped(self):
+        self.get(reverse('posts:index'), PROFILER_SLOW_MS=60_000)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sampled_request_and_summary(self):
+        """Выбранный запрос профилируется cProfile, сводка его читает"""
+        self.get(
+            reverse('posts:index'),
+            PROFILER_SLOW_MS=60_000, PROFILER_SAMPLE_RATE=1
+        )
+        self.assertTrue(any(
+            name.endswith('.pstats') for name in os.listdir(self.directory)
+        ))
+        out = StringIO()
+        call_command(
+            'profile_summary', dir=self.directory, view='posts:index',
+            stdout=out
+        )
+        self.assertIn('cProfile: 1', out.getvalue())
+        self.assertIn('views.py', out.getvalue())
+
+    def test_stack_sampler(self):
+        """Сэмплер снимает стек наблюдаемого потока"""
+        def busy_loop():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = StackSampler(0.001)
+        sampler.start(threading.get_ident())
+        busy_loop()
+        samples = sampler.stop(threading.get_ident())
+        self.assertTrue(any('busy_loop' in stack for stack in samples))
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, connections
+from django.middleware.cache import CacheMiddleware
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail.models import KVStore
+
+from core.db.routers import ReplicaRouter, Routing, routing
+from posts.models import Post
+
+User = get_user_model()
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(TestCase):
+    """Чтение из второго файла SQLite, отстающего от основной базы"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.old_post = Post.objects.create(
+            author=self.author, text='Запись есть в реплике'
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'replica.sqlite3')
+        # копия основной базы на этот момент — «отставшая реплика»
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        # без поискового индекса FTS5: iterdump не воссоздаёт его таблицы
+        replica.executescript('\n'.join(
+            statement for statement in connection.connection.iterdump()
+            if 'posts_post_fts' not in statement
+        ))
+        replica.close()
+        connections.databases[REPLICA] = {
+            **connections.databases['default'], 'NAME': path,
+        }
+        self.addCleanup(self.remove_replica)
+        self.new_post = Post.objects.create(
+            author=self.author, text='Записи ещё нет в реплике'
+        )
+        self.client = Client()
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def detail(self, post):
+        return self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.detail(self.old_post).status_code, 200)
+        self.assertEqual(self.detail(self.new_post).status_code, 404)
+
+    def test_sticky_cookie_reads_primary(self):
+        self.client.cookies[settings.DB_REPLICA_STICKY_COOKIE] = '1'
+        self.assertEqual(self.detail(self.new_post).status_code, 200)
+
+    def test_write_sets_sticky_cookie(self):
+        """После записи посетитель читает из основной базы"""
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}
+        ))
+        cookie = response.cookies[settings.DB_REPLICA_STICKY_COOKIE]
+        self.assertEqual(
+            cookie['max-age'], settings.DB_REPLICA_STICKY_SECONDS
+        )
+        self.assertEqual(self.detail(self.new_post).status_code, 200)
+
+    def cached_index(self):
+        """Главная страница и время, на которое она попала в кеш."""
+        timeouts = []
+        process_response = CacheMiddleware.process_response
+
+        def record(middleware, request, response):
+            timeouts.append(middleware.cache_timeout)
+            return process_response(middleware, request, response)
+
+        with mock.patch.object(CacheMiddleware, 'process_response', record):
+            response = self.client.get(reverse('posts:index'))
+        return response, timeouts
+
+    def test_page_from_replica_is_cached_briefly(self):
+        """Страница по реплике кешируется ненадолго и без cookie"""
+        response, timeouts = self.cached_index()
+        self.assertNotContains(response, 'Записи ещё нет в реплике')
+        self.assertEqual(timeouts, [settings.DB_REPLICA_PAGE_CACHE_TIMEOUT])
+        self.assertNotIn(
+            settings.DB_REPLICA_STICKY_COOKIE, response.cookies
+        )
+
+    def test_page_from_primary_is_cached_separately(self):
+        """Читающий основную базу не получает страницу по реплике"""
+        self.cached_index()
+        self.client.cookies[settings.DB_REPLICA_STICKY_COOKIE] = '1'
+        response, timeouts = self.cached_index()
+        self.assertContains(response, 'Записи ещё нет в реплике')
+        self.assertEqual(timeouts, [settings.PAGE_CACHE_TIMEOUT])
+
+    def test_other_views_read_primary(self):
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'ещё нет'}
+        )
+        self.assertContains(response, 'Записи ещё нет в реплике')
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        state = Routing()
+        state.replica = REPLICA
+        token = routing.set(state)
+        try:
+            self.assertEqual(router.db_for_read(Post), REPLICA)
+            self.assertEqual(router.db_for_write(Post), 'default')
+        finally:
+            routing.reset(token)
+        self.assertTrue(state.wrote)
+        self.assertFalse(router.allow_migrate(REPLICA, 'posts'))
+
+    def test_service_writes_are_not_sticky(self):
+        """Записи kvstore миниатюр и сессий не ставят cookie"""
+        router = ReplicaRouter()
+        state = Routing()
+        token = routing.set(state)
+        try:
+            for model in (KVStore, Session):
+                self.assertEqual(router.db_for_write(model), 'default')
+        finally:
+            routing.reset(token)
+        self.assertFalse(state.wrote)
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Post, Group, Comment, Follow
+
+from . import search
+from .models import Post, Group, Comment, Follow, MediaBlob, UserStats
 
 
 @admin.register(Post)
@@ -10,6 +12,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через полнотекстовый индекс вместо LIKE по search_fields
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -35,3 +43,21 @@ class FollowAdmin(admin.ModelAdmin):
     list_editable = ('user', 'author')
     search_fields = ('user', 'author',)
     list_filter = ('user',)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user', 'posts_count', 'comments_count',
+        'followers_count', 'following_count',
+    )
+    search_fields = ('user__username',)
+    readonly_fields = list_display
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'refcount', 'updated')
+    list_filter = ('refcount',)
+    search_fields = ('name',)
+    readonly_fields = list_display
@@ -0,0 +1,147 @@
+"""
+JSON API только для чтения: ленты и запись с комментариями.
+
+Каждый ответ получает строгий ETag и Last-Modified (posts.conditional),
+поэтому клиент, который опрашивает ленту с If-None-Match /
+If-Modified-Since, получает 304 без выборки и сериализации страницы.
+"""
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+from django.views.decorators.vary import vary_on_cookie
+
+from . import cache, timeline
+from .conditional import (
+    conditional, feed_state, group_state, index_state, post_state,
+    profile_state
+)
+from .models import Group, Post, User
+from .utils import comment_page, page_list
+
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def login_required(view):
+    """Как auth.login_required, но с 401 вместо перенаправления."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return json_response(
+                {'detail': 'Требуется авторизация.'}, status=401
+            )
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'updated': post.updated.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def page_links(request, page_obj):
+    """Ссылки на следующую и предыдущую страницы (или None)."""
+    def link(**params):
+        return f'{request.path}?{urlencode(params)}'
+
+    if getattr(page_obj, 'is_cursor', False):
+        return (
+            link(cursor=page_obj.next_cursor)
+            if page_obj.has_next() else None,
+            link(cursor=page_obj.previous_cursor)
+            if page_obj.has_previous() else None,
+        )
+    return (
+        link(page=page_obj.next_page_number())
+        if page_obj.has_next() else None,
+        link(page=page_obj.previous_page_number())
+        if page_obj.has_previous() else None,
+    )
+
+
+def feed_response(request, post_list, scope=None):
+    page_obj = page_list(
+        post_list.select_related('author', 'group'), request, scope
+    )
+    next_link, previous_link = page_links(request, page_obj)
+    return json_response({
+        'results': [serialize_post(post) for post in page_obj],
+        'next': next_link,
+        'previous': previous_link,
+    })
+
+
+@require_safe
+@conditional(index_state)
+def index(request):
+    return feed_response(request, Post.objects.all(), cache.ALL)
+
+
+@require_safe
+@conditional(group_state)
+def group(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, group.posts.all(), cache.group_scope(group.pk)
+    )
+
+
+@require_safe
+@conditional(profile_state)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(
+        request, author.posts.all(), cache.author_scope(author.pk)
+    )
+
+
+@require_safe
+@login_required
+@vary_on_cookie
+@conditional(
+    lambda request: (
+        *feed_state(timeline.feed(request.user).queryset()), []
+    ),
+    lambda request: (request.user.pk,)
+)
+def follow(request):
+    return feed_response(request, timeline.feed(request.user))
+
+
+@require_safe
+@conditional(post_state)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    comments = comment_page(
+        post.comments.select_related('author'), request.GET.get('cursor')
+    )
+    data = serialize_post(post)
+    data['comments'] = {
+        'results': [serialize_comment(comment) for comment in comments],
+        'next': page_links(request, comments)[0],
+    }
+    return json_response(data)
@@ -0,0 +1,169 @@
+"""
+Кеш страниц с поколениями.
+
+Ключ страницы содержит номера поколений областей, от которых она зависит:
+вся лента, группа, автор, запись. Запись в базу не ищет и не удаляет
+ключи страниц, а увеличивает номер поколения области — старые страницы
+просто перестают читаться и вытесняются по таймауту. Поэтому страницы
+можно хранить долго и при этом не показывать устаревшие данные.
+
+Счётчики лежат в том же кеше, что и страницы, поэтому при нескольких
+процессах gunicorn бэкенд должен быть общим (см. CACHES в settings).
+
+Страница, в которой вместо миниатюры или вариантов картинки ещё стоит
+исходный файл (posts.fragments), не кешируется.
+
+Страница кешируется одна на всех посетителей: куски, зависящие
+от пользователя, остаются в ней заглушками и подставляются при каждом
+ответе (см. posts.chrome).
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.cache import CacheMiddleware
+
+from core.db.routers import replica_reads
+from core.metrics import CACHE_REQUESTS
+
+from . import chrome
+from .fragments import collect_placeholders
+from .models import Group, Post, User
+
+GENERATION_KEY = 'posts.generation.{}'
+ALL = 'all'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def initial_generation():
+    # После вытеснения счётчика номер не должен повторить старый
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes):
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, initial_generation(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def request_generations(request, get_scopes):
+    """Поколения областей страницы; считаются один раз за запрос."""
+    if not hasattr(request, 'page_generations'):
+        request.page_generations = get_generations(get_scopes())
+    return request.page_generations
+
+
+def bump(*scopes):
+    """Делает устаревшими все страницы, зависящие от scopes."""
+    for scope in set(scopes):
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, initial_generation(), timeout=None)
+
+
+def fill_chrome(request, response):
+    if response.streaming or response.status_code != 200:
+        return response
+    response.content = chrome.fill(
+        request, response.content.decode(response.charset)
+    )
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = str(len(response.content))
+    return response
+
+
+def cache_page_versioned(key_prefix, scopes):
+    """
+    Аналог cache_page, у которого префикс ключа включает поколения
+    областей scopes(request, *args, **kwargs). Заглушки posts.chrome
+    заполняются уже после записи страницы в кеш.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            generations = request_generations(
+                request, lambda: scopes(request, *args, **kwargs)
+            )
+            # страница по отстающей реплике может не содержать записи,
+            # которая уже сменила поколение, поэтому живёт недолго
+            replica = replica_reads()
+            middleware = CacheMiddleware(
+                cache_timeout=(
+                    settings.DB_REPLICA_PAGE_CACHE_TIMEOUT if replica
+                    else settings.PAGE_CACHE_TIMEOUT
+                ),
+                key_prefix='.'.join([
+                    key_prefix, *map(str, generations),
+                    *(['replica'] if replica else []),
+                ]),
+            )
+            request.chrome_deferred = True
+            try:
+                response = middleware.process_request(request)
+                CACHE_REQUESTS.inc(
+                    prefix=key_prefix,
+                    result='miss' if response is None else 'hit'
+                )
+                if response is None:
+                    with collect_placeholders() as found:
+                        response = view(request, *args, **kwargs)
+                    # страница с исходной картинкой вместо миниатюры
+                    # кешируется, когда фоновая обработка закончится
+                    if not found:
+                        response = middleware.process_response(
+                            request, response
+                        )
+            finally:
+                # страницу ошибки (Http404 из view) рисует обработчик,
+                # и заглушки в ней заполнять уже некому
+                request.chrome_deferred = False
+            return fill_chrome(request, response)
+        return wrapper
+    return decorator
+
+
+def index_scopes(request):
+    return [ALL]
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    return [group_scope(group_id)]
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    return [author_scope(author_id)]
+
+
+def post_scopes(request, post_id):
+    post = Post.objects.filter(pk=post_id).order_by().values(
+        'author_id', 'group_id'
+    ).first() or {}
+    return [
+        post_scope(post_id),
+        author_scope(post.get('author_id')),
+        group_scope(post.get('group_id')),
+    ]
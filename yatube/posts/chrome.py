@@ -0,0 +1,96 @@
+"""
+Пользовательские куски кешируемых страниц.
+
+Страницы из posts.cache.cache_page_versioned кешируются одним экземпляром
+для всех посетителей, поэтому всё, что зависит от пользователя (шапка,
+кнопки подписки и правки, форма комментария), выводится тегом
+{% chrome "имя" аргументы %}. При кешируемом запросе тег оставляет
+в HTML заглушку <!--chrome:имя аргументы-->, а fill() после выборки
+страницы из кеша заменяет заглушки на куски, отрисованные для текущего
+запроса. В остальных представлениях тег отрисовывает кусок сразу.
+"""
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+
+from .forms import CommentForm
+from .models import Follow
+
+PLACEHOLDER_RE = re.compile(r'<!--chrome:(\w+)((?: [^ >]*)*)-->')
+
+pieces = {}
+
+
+def register(name):
+    def decorator(func):
+        pieces[name] = func
+        return func
+    return decorator
+
+
+def is_deferred(request):
+    return getattr(request, 'chrome_deferred', False)
+
+
+def placeholder(name, args):
+    return ''.join(
+        [f'<!--chrome:{name}', *(f' {quote(str(arg))}' for arg in args), '-->']
+    )
+
+
+def render(request, name, args):
+    return pieces[name](request, *args)
+
+
+def fill(request, content):
+    """Подставляет куски текущего запроса вместо заглушек."""
+    def replace(match):
+        args = [unquote(arg) for arg in match.group(2).split()]
+        return render(request, match.group(1), args)
+    return PLACEHOLDER_RE.sub(replace, content)
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
+
+
+@register('switcher')
+def switcher(request):
+    return render_to_string('includes/switcher.html', request=request)
+
+
+@register('follow_button')
+def follow_button(request, username):
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author__username=username
+        ).exists()
+    )
+    return render_to_string(
+        'includes/follow_button.html',
+        {'username': username, 'following': following},
+        request=request,
+    )
+
+
+@register('post_edit_button')
+def post_edit_button(request, post_id, author_id):
+    if str(request.user.pk) != author_id:
+        return ''
+    return render_to_string(
+        'includes/post_edit_button.html', {'post_id': post_id}
+    )
+
+
+@register('comment_form')
+def comment_form(request, post_id):
+    if not request.user.is_authenticated:
+        return ''
+    return render_to_string(
+        'includes/comment_form.html',
+        {'post_id': post_id, 'form': CommentForm()},
+        request=request,
+    )
@@ -0,0 +1,156 @@
+"""
+Условные GET-запросы для лент и записей.
+
+ETag лент строится из поколений областей posts.cache: любая правка
+или удаление записи увеличивает поколение её ленты, поэтому таблицу
+записей для него читать не нужно. Last-Modified ленты — время самой
+новой записи, одно обращение к индексу по pub_date; правку старой
+записи он не отражает, её видно только по ETag. Для записи
+валидаторы считаются по ней самой и её комментариям. В ETag входит
+и путь с параметрами, поэтому у каждой страницы ленты свой ETag.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import cache
+from .models import Group, Post, User
+
+
+def make_etag(request, *parts):
+    source = '|'.join(map(str, (request.get_full_path(), *parts)))
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def feed_state(post_list):
+    """Состояние личной ленты подписок: у неё нет своего поколения."""
+    state = post_list.order_by().aggregate(
+        last_modified=Max('updated'), count=Count('id')
+    )
+    return state['last_modified'], state['count']
+
+
+def latest(posts):
+    """Время самой новой записи; читается по индексу ленты."""
+    return posts.order_by('-pub_date', '-id').values('pub_date')[:1]
+
+
+def index_state(request):
+    last_modified = latest(Post.objects.all()).values_list(
+        'pub_date', flat=True
+    ).first()
+    return last_modified, None, cache.index_scopes(request)
+
+
+def owner_state(queryset, field, scope):
+    """Время новой записи группы или автора вместе с его id."""
+    state = queryset.order_by().values('id').annotate(
+        last_modified=Subquery(
+            latest(Post.objects.filter(**{field: OuterRef('pk')}))
+        )
+    ).first() or {}
+    return state.get('last_modified'), None, [scope(state.get('id'))]
+
+
+def group_state(request, slug):
+    return owner_state(
+        Group.objects.filter(slug=slug), 'group', cache.group_scope
+    )
+
+
+def profile_state(request, username):
+    return owner_state(
+        User.objects.filter(username=username), 'author', cache.author_scope
+    )
+
+
+def post_state(request, post_id):
+    state = Post.objects.filter(pk=post_id).order_by().values(
+        'updated', 'author_id', 'group_id'
+    ).annotate(
+        last_comment=Max('comments__created'), count=Count('comments')
+    ).first()
+    if state is None:
+        raise Http404('Запись не найдена.')
+    last_modified = max(
+        filter(None, (state['updated'], state['last_comment']))
+    )
+    return last_modified, state['count'], [
+        cache.post_scope(post_id),
+        cache.author_scope(state['author_id']),
+        cache.group_scope(state['group_id']),
+    ]
+
+
+def conditional(state, extra=None):
+    """
+    condition() с валидаторами из state(request, *args, **kwargs) →
+    (last_modified, количество или None, области posts.cache). В ETag
+    входят и поколения областей: они меняются при любой правке записей,
+    группы или подписке. extra добавляет в ETag свои части или
+    возвращает None, чтобы не отдавать валидаторы.
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, 'validators'):
+            parts = extra(request, *args, **kwargs) if extra else ()
+            if parts is None:
+                request.validators = (None, None)
+            else:
+                last_modified, count, scopes = state(
+                    request, *args, **kwargs
+                )
+                generations = cache.request_generations(
+                    request, lambda: scopes
+                )
+                request.validators = (
+                    make_etag(
+                        request, last_modified, count, *generations, *parts
+                    ),
+                    last_modified,
+                )
+        return request.validators
+
+    return condition(
+        etag_func=lambda *args, **kwargs: get_validators(*args, **kwargs)[0],
+        last_modified_func=lambda *args, **kwargs: (
+            get_validators(*args, **kwargs)[1]
+        ),
+    )
+
+
+def conditional_page(state):
+    """
+    Условный GET для HTML-страницы. Валидаторы получает только аноним:
+    страница авторизованного зависит от пользователя и не кешируется
+    браузером. Области из state совпадают с областями кеша страниц,
+    поэтому поколения для него уже посчитаны.
+    """
+    def anonymous(request, *args, **kwargs):
+        return None if request.user.is_authenticated else ()
+
+    def decorator(view):
+        conditional_view = conditional(state, anonymous)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            # Expires и max-age от кеша страниц к браузеру не относятся
+            del response['Expires']
+            if request.user.is_authenticated:
+                patch_cache_control(
+                    response, private=True, no_cache=True, max_age=0
+                )
+            else:
+                patch_cache_control(
+                    response, public=True,
+                    max_age=settings.HTML_CACHE_MAX_AGE
+                )
+            return response
+        return wrapper
+    return decorator
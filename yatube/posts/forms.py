@@ -1,5 +1,9 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+
 from .models import Post, Comment
+from .uploads import check_size, process_image
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +11,27 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # слишком большой файл отклоняется до того, как его откроет Pillow
+        self.image_error = None
+        upload = self.files.get(self.add_prefix('image'))
+        if upload is not None:
+            try:
+                check_size(upload)
+            except ValidationError as error:
+                self.image_error = error
+                self.files = self.files.copy()
+                self.files.pop(self.add_prefix('image'))
+
+    def clean_image(self):
+        if self.image_error is not None:
+            raise self.image_error
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return process_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,105 @@
+"""
+Кеш отрисованных карточек записей (includes/posts_card.html).
+
+Карточка не зависит от пользователя, поэтому одна и та же разметка
+переиспользуется на главной, в группах, профилях и ленте подписок.
+Ключ содержит id записи, время её изменения, имя и логин автора и
+адрес группы: после правки читается новая карточка, старая вытесняется
+по таймауту. Карточка, в которой вместо миниатюры или вариантов
+картинки ещё стоит исходный файл (они готовятся в фоне), не кешируется;
+так же поступает кеш страниц (posts.cache).
+
+Каждое обращение отправляет сигнал card_rendered — к нему подключается
+сбор статистики: доля попаданий и сэкономленное время отрисовки; в
+метрики core.metrics они попадают как yatube_cache_requests_total и
+yatube_card_render_seconds_total.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.dispatch import Signal
+
+from core.metrics import CACHE_REQUESTS, CARD_RENDER_SECONDS
+
+card_rendered = Signal(providing_args=['hit', 'render_time'])
+# списки заглушек вложенных отрисовок (страница, карточка), которые
+# собираются сейчас
+placeholders = ContextVar('placeholders', default=())
+
+
+def card_key(post, vary_on):
+    # имя автора может содержать пробелы и кириллицу, недопустимые
+    # в ключах memcached, поэтому подписи входят в ключ хешем
+    labels = '|'.join([
+        post.author.username, post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    ])
+    parts = [
+        str(post.pk), str(post.updated.timestamp()),
+        hashlib.sha1(labels.encode()).hexdigest(),
+        *map(str, vary_on),
+    ]
+    return 'posts.card.' + '.'.join(parts)
+
+
+@contextmanager
+def collect_placeholders():
+    """Заглушки, отрисованные в блоке; без них разметку можно кешировать."""
+    found = []
+    token = placeholders.set((*placeholders.get(), found))
+    try:
+        yield found
+    finally:
+        placeholders.reset(token)
+
+
+def mark_placeholder():
+    """Вместо готовой картинки отрисована заглушка."""
+    for found in placeholders.get():
+        found.append(True)
+
+
+class CardStats:
+    """Статистика кеша карточек в текущем процессе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.render_time = 0.0
+        self.saved_time = 0.0
+
+    def record(self, sender, hit, render_time, **kwargs):
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.saved_time += render_time
+            else:
+                self.misses += 1
+                self.render_time += render_time
+
+    def snapshot(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'render_time': self.render_time,
+                'saved_time': self.saved_time,
+            }
+
+
+def count_card(sender, hit, render_time, **kwargs):
+    CACHE_REQUESTS.inc(prefix='card', result='hit' if hit else 'miss')
+    CARD_RENDER_SECONDS.inc(render_time, result='saved' if hit else 'spent')
+
+
+stats = CardStats()
+card_rendered.connect(stats.record)
+card_rendered.connect(count_card)
@@ -0,0 +1,136 @@
+"""
+Адаптивные варианты картинок записей.
+
+Для каждой картинки готовятся кадры нескольких ширин (IMAGE_VARIANT_WIDTHS)
+с пропорциями карточки в современных форматах — WebP и AVIF, если их
+поддерживает установленный Pillow, — и в JPEG для старых браузеров.
+Имена файлов детерминированы (хеш имени исходника и ширина), а список
+готовых вариантов запоминается в кеше, поэтому повторная отрисовка
+не обращается ни к Pillow, ни к диску. Недостающие варианты готовит
+фоновый пул из posts.thumbnails.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from . import thumbnails
+from .fragments import mark_placeholder
+
+VARIANT_DIR = 'variants'
+CACHE_KEY = 'posts.variants.{}'
+
+# формат Pillow, расширение файла и MIME-тип
+FORMATS = {
+    'AVIF': ('avif', 'image/avif'),
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+
+def supported_formats():
+    """Форматы вариантов в порядке предпочтения; JPEG есть всегда."""
+    Image.init()
+    formats = []
+    if 'AVIF' in Image.SAVE:
+        formats.append('AVIF')
+    if features.check('webp'):
+        formats.append('WEBP')
+    formats.append('JPEG')
+    return formats
+
+
+def source_digest(source_name):
+    return hashlib.sha1(source_name.encode()).hexdigest()
+
+
+def variant_name(source_name, width, image_format):
+    digest = source_digest(source_name)
+    extension = FORMATS[image_format][0]
+    return f'{VARIANT_DIR}/{digest[:2]}/{digest}-{width}w.{extension}'
+
+
+def variant_size(width):
+    ratio_width, ratio_height = settings.IMAGE_VARIANT_ASPECT
+    return width, round(width * ratio_height / ratio_width)
+
+
+def build_variants(source_name):
+    """Декодирует исходник один раз и сохраняет все недостающие варианты."""
+    with default_storage.open(source_name) as source_file:
+        source = Image.open(source_file)
+        source.load()
+    source = ImageOps.exif_transpose(source).convert('RGB')
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        frame = None
+        for image_format in supported_formats():
+            name = variant_name(source_name, width, image_format)
+            if default_storage.exists(name):
+                continue
+            if frame is None:
+                frame = ImageOps.fit(
+                    source, variant_size(width), Image.LANCZOS
+                )
+            buffer = BytesIO()
+            frame.save(
+                buffer, image_format,
+                quality=settings.IMAGE_VARIANT_QUALITY
+            )
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+    cache.delete(CACHE_KEY.format(source_digest(source_name)))
+
+
+def delete_variants(source_name):
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        for image_format in FORMATS:
+            default_storage.delete(
+                variant_name(source_name, width, image_format)
+            )
+    cache.delete(CACHE_KEY.format(source_digest(source_name)))
+
+
+def schedule_variants(source_name):
+    thumbnails.submit(('variants', source_name), build_variants, source_name)
+
+
+def get_sources(source_name):
+    """
+    Список <source> для <picture>: [{'type', 'srcset', 'format'}, ...].
+    Пока варианты не готовы, ставит их в очередь и возвращает [].
+    """
+    key = CACHE_KEY.format(source_digest(source_name))
+    sources = cache.get(key)
+    if sources is not None:
+        return sources
+    sources = ready_sources(source_name)
+    if sources is None:
+        schedule_variants(source_name)
+        mark_placeholder()
+        return []
+    cache.set(key, sources, None)
+    return sources
+
+
+def ready_sources(source_name):
+    """Список <source>, если все варианты уже сохранены, иначе None."""
+    sources = []
+    for image_format in supported_formats():
+        names = [
+            (variant_name(source_name, width, image_format), width)
+            for width in settings.IMAGE_VARIANT_WIDTHS
+        ]
+        if not all(default_storage.exists(name) for name, _ in names):
+            return None
+        sources.append({
+            'format': image_format,
+            'type': FORMATS[image_format][1],
+            'srcset': ', '.join(
+                f'{default_storage.url(name)} {width}w'
+                for name, width in names
+            ),
+        })
+    return sources
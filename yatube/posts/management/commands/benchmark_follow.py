@@ -0,0 +1,111 @@
+import math
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет поиск подписок по (user, author), подписчиков автора и '
+        'ленты подписок на синтетической таблице posts_follow. Данные '
+        'создаются внутри транзакции и откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1_000_000,
+            help='Количество строк в posts_follow.'
+        )
+        parser.add_argument(
+            '--lookups', type=int, default=1000,
+            help='Количество повторов каждого запроса.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10_000,
+            help='Размер пачки для bulk_create.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            readers, authors = self.populate(
+                options['rows'], options['batch_size']
+            )
+            self.run(readers, authors, options['lookups'])
+            transaction.set_rollback(True)
+
+    def populate(self, rows, batch_size):
+        side = math.ceil(math.sqrt(rows))
+        User.objects.bulk_create(
+            [User(username=f'bench_follow_{i}') for i in range(2 * side)]
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith='bench_follow_'
+        ).order_by('pk').values_list('pk', flat=True))
+        readers, authors = user_ids[:side], user_ids[side:]
+        Post.objects.bulk_create(
+            [Post(author_id=author_id, text='benchmark')
+             for author_id in authors]
+        )
+        started = time.perf_counter()
+        batch = []
+        for number in range(rows):
+            batch.append(Follow(
+                user_id=readers[number // side],
+                author_id=authors[number % side]
+            ))
+            if len(batch) >= batch_size:
+                Follow.objects.bulk_create(batch)
+                batch = []
+        Follow.objects.bulk_create(batch)
+        self.stdout.write(
+            f'posts_follow: {rows} строк за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+        return readers, authors
+
+    def run(self, readers, authors, lookups):
+        cases = (
+            ('profile (user, author)', lambda user_id, author_id: (
+                Follow.objects.filter(
+                    user_id=user_id, author_id=author_id
+                ).exists()
+            )),
+            ('followers (author)', lambda user_id, author_id: (
+                Follow.objects.filter(author_id=author_id).count()
+            )),
+            ('follow_index join', lambda user_id, author_id: list(
+                Post.objects.filter(
+                    author__following__user_id=user_id
+                ).values_list('id', flat=True)[:10]
+            )),
+        )
+        for title, query in cases:
+            timings = []
+            for _ in range(lookups):
+                user_id = random.choice(readers)
+                author_id = random.choice(authors)
+                started = time.perf_counter()
+                query(user_id, author_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{title:<24} p50 {statistics.median(timings):.3f} мс, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.3f} мс'
+            )
+        self.stdout.write('План запросов:')
+        user_id, author_id = readers[0], authors[0]
+        plans = (
+            Follow.objects.filter(user_id=user_id, author_id=author_id),
+            Follow.objects.filter(author_id=author_id),
+            Post.objects.filter(author__following__user_id=user_id),
+        )
+        for queryset in plans:
+            self.stdout.write(queryset.explain())
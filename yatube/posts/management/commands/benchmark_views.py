@@ -0,0 +1,178 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from posts.models import Follow, Group, Post, User
+from posts.seed import Seeder
+
+
+def percentile(timings, share):
+    return timings[max(int(len(timings) * share) - 1, 0)]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет index, group_posts, profile, post_detail и follow_index '
+        'на синтетических данных нескольких размеров: p50/p95 и число '
+        'запросов. Данные создаются seed_load внутри транзакции '
+        'и откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10_000, 100_000],
+            help='Количество записей в каждом прогоне.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько раз запрашивать каждую страницу.'
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кеш между запросами (замер попаданий в кеш).'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора данных.'
+        )
+        parser.add_argument(
+            '--output', help='Сохранить результаты в JSON-файл.'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON-файл прошлого прогона для сравнения p50.'
+        )
+
+    def handle(self, *args, **options):
+        baseline = self.load(options['compare']) if options['compare'] else {}
+        results = []
+        for size in options['sizes']:
+            with transaction.atomic():
+                started = time.perf_counter()
+                Seeder(seed=options['seed']).run(
+                    users=max(size // 50, 20),
+                    groups=max(size // 2000, 5),
+                    posts=size,
+                    comments=size * 2,
+                    follows=20,
+                )
+                self.stdout.write(
+                    f'{size} записей: данные за '
+                    f'{time.perf_counter() - started:.1f} с'
+                )
+                for view, url, user in self.cases():
+                    result = self.measure(
+                        url, user, options['requests'], options['warm']
+                    )
+                    result.update(size=size, view=view)
+                    results.append(result)
+                    self.report(result, baseline.get((size, view)))
+                transaction.set_rollback(True)
+            cache.clear()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump({
+                    'commit': current_commit(),
+                    'created': timezone.now().isoformat(),
+                    'warm': options['warm'],
+                    'results': results,
+                }, stream, ensure_ascii=False, indent=2)
+
+    def cases(self):
+        """(представление, адрес, пользователь) для замеров."""
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        author = User.objects.order_by('-stats__posts_count').first()
+        post = Post.objects.annotate(
+            total=Count('comments')
+        ).order_by('-total').first()
+        reader = User.objects.get(
+            pk=Follow.objects.values_list('user_id', flat=True).first()
+        )
+        anonymous = AnonymousUser()
+        return [
+            ('index', reverse('posts:index'), anonymous),
+            ('group_posts', reverse(
+                'posts:group_list', kwargs={'slug': group.slug}
+            ), anonymous),
+            ('profile', reverse(
+                'posts:profile', kwargs={'username': author.username}
+            ), anonymous),
+            ('post_detail', reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk}
+            ), anonymous),
+            ('follow_index', reverse('posts:follow_index'), reader),
+        ]
+
+    def measure(self, url, user, requests, warm):
+        factory = RequestFactory()
+        match = resolve(url)
+        timings = []
+        queries = 0
+        for _ in range(requests):
+            if not warm:
+                cache.clear()
+            request = factory.get(url)
+            request.user = user
+            request.resolver_match = match
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = match.func(request, *match.args, **match.kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries = max(queries, len(captured))
+        timings.sort()
+        return {
+            'p50': round(statistics.median(timings), 3),
+            'p95': round(percentile(timings, 0.95), 3),
+            'queries': queries,
+        }
+
+    def report(self, result, previous):
+        line = (
+            f'  {result["view"]:<14} p50 {result["p50"]:8.2f} мс, '
+            f'p95 {result["p95"]:8.2f} мс, запросов {result["queries"]}'
+        )
+        if previous:
+            change = (result['p50'] / previous['p50'] - 1) * 100
+            line += (
+                f' (p50 {change:+.0f}%, запросов было {previous["queries"]})'
+            )
+        self.stdout.write(line)
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as stream:
+                data = json.load(stream)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        self.stdout.write(f'Сравнение с {data.get("commit") or path}')
+        return {
+            (result['size'], result['view']): result
+            for result in data['results']
+        }
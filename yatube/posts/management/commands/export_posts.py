@@ -0,0 +1,35 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, записи, комментарии и подписки '
+        'в NDJSON (для import_posts).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки; .gz — со сжатием, - — stdout.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            transfer.export(sys.stdout, options['chunk_size'])
+            return
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as stream:
+            totals = transfer.export(stream, options['chunk_size'])
+        summary = ', '.join(
+            f'{name}: {total}' for name, total in totals.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Выгружено — {summary}.'))
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import images
+from posts.models import MediaBlob, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки записей, на которые больше нет ссылок, вместе '
+        'с их миниатюрами и вариантами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=None,
+            help='Не трогать файлы моложе стольких секунд '
+                 '(по умолчанию MEDIA_GC_GRACE).'
+        )
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Также обойти каталог картинок и удалить файлы, '
+                 'которых нет ни в MediaBlob, ни в записях.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        grace = options['grace']
+        if grace is None:
+            grace = settings.MEDIA_GC_GRACE
+        self.cutoff = timezone.now() - timedelta(seconds=grace)
+        self.dry_run = options['dry_run']
+        self.storage = Post._meta.get_field('image').storage
+        removed = 0
+        orphans = MediaBlob.objects.filter(
+            refcount=0, updated__lt=self.cutoff
+        ).values_list('name', flat=True)
+        for name in list(orphans):
+            removed += self.collect(name)
+        if options['scan']:
+            upload_to = Post._meta.get_field('image').upload_to
+            for name in self.walk(upload_to.rstrip('/')):
+                if (
+                    self.modified(name) < self.cutoff
+                    and not MediaBlob.objects.filter(name=name).exists()
+                    and not Post.objects.filter(image=name).exists()
+                ):
+                    removed += self.remove(name)
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {removed}.'))
+
+    def collect(self, name):
+        """Удаляет файл без ссылок, если он не используется снова."""
+        with transaction.atomic():
+            # строка блокируется до конца транзакции, поэтому загрузка
+            # той же картинки (storage.touch) ждёт удаления файла;
+            # условия проверяются заново уже под блокировкой
+            blob = MediaBlob.objects.select_for_update().filter(
+                name=name, refcount=0, updated__lt=self.cutoff
+            )
+            if not blob.update(refcount=0):
+                return 0
+            references = Post.objects.filter(image=name).count()
+            if references:
+                # счётчик разошёлся с таблицей записей
+                if not self.dry_run:
+                    blob.update(refcount=references)
+                return 0
+            return self.remove(name)
+
+    def walk(self, directory):
+        if not self.storage.exists(directory):
+            return
+        directories, files = self.storage.listdir(directory)
+        for filename in files:
+            yield f'{directory}/{filename}'
+        for subdirectory in directories:
+            yield from self.walk(f'{directory}/{subdirectory}')
+
+    def modified(self, name):
+        return self.storage.get_modified_time(name)
+
+    def remove(self, name):
+        self.stdout.write(name)
+        if self.dry_run:
+            return 1
+        if self.storage.exists(name):
+            default.kvstore.delete(ImageFile(name, self.storage))
+            self.storage.delete(name)
+        images.delete_variants(name)
+        MediaBlob.objects.filter(name=name, refcount=0).delete()
+        return 1
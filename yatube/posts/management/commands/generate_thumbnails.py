@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры THUMBNAIL_SIZES для всех картинок записей.'
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).order_by()
+        storage = Post._meta.get_field('image').storage
+        total = 0
+        for name in images.iterator():
+            for geometry, thumbnail_options in settings.THUMBNAIL_SIZES:
+                default.backend.generate(
+                    ImageFile(name, storage), geometry,
+                    **dict(thumbnail_options)
+                )
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры подготовлены для {total} картинок.'
+        ))
@@ -0,0 +1,39 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_posts пачками bulk_create в одной '
+        'транзакции, назначая объектам новые id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки; .gz — со сжатием, - — stdin.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        importer = transfer.Importer(options['batch_size'])
+        try:
+            if path == '-':
+                created = importer.load(sys.stdin)
+            else:
+                opener = gzip.open if path.endswith('.gz') else open
+                with opener(path, 'rt', encoding='utf-8') as stream:
+                    created = importer.load(stream)
+        except (OSError, transfer.TransferError) as error:
+            raise CommandError(error)
+        summary = ', '.join(
+            f'{name}: {total}' for name, total in created.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Загружено — {summary}.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику пользователей по исходным таблицам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create.'
+        )
+
+    def handle(self, *args, **options):
+        total = UserStats.objects.rebuild_all(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана для {total} пользователей.'
+        ))
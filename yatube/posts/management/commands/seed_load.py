@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.seed import SeedError, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, записями '
+        '(авторы по закону Ципфа), комментариями и подписками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument(
+            '--follows-per-user', type=int, default=20,
+            help='На скольких авторов подписан каждый пользователь.'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель s распределения авторов 1 / k^s.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пачки для bulk_create.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Зерно генератора для воспроизводимых данных.'
+        )
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            batch_size=options['batch_size'],
+            zipf=options['zipf'],
+            seed=options['seed'],
+        )
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                totals = seeder.run(
+                    users=options['users'],
+                    groups=options['groups'],
+                    posts=options['posts'],
+                    comments=options['comments'],
+                    follows=options['follows_per_user'],
+                )
+        except SeedError as error:
+            raise CommandError(error)
+        summary = ', '.join(
+            f'{name}: {total}' for name, total in totals.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано — {summary} за {time.perf_counter() - started:.1f} с.'
+        ))
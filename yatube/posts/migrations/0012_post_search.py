@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:02
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    tables = {
+        'post': Post._meta.db_table,
+        'group': Group._meta.db_table,
+        'user': User._meta.db_table,
+    }
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+            'text, group_title, author_name, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO posts_post_fts '
+            '(rowid, text, group_title, author_name) '
+            "SELECT p.id, p.text, COALESCE(g.title, ''), "
+            "TRIM(u.first_name || ' ' || u.last_name || ' ' || u.username) "
+            'FROM {post} p JOIN {user} u ON u.id = p.author_id '
+            'LEFT JOIN {group} g ON g.id = p.group_id'.format(**tables)
+        )
+    elif vendor == 'postgresql':
+        config = settings.SEARCH_CONFIG
+        schema_editor.execute(
+            'CREATE TABLE posts_post_search ('
+            'post_id integer PRIMARY KEY, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX posts_post_search_document_idx '
+            'ON posts_post_search USING GIN (document)'
+        )
+        schema_editor.execute(
+            'INSERT INTO posts_post_search (post_id, document) '
+            "SELECT p.id, "
+            "setweight(to_tsvector(%s::regconfig, p.text), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, "
+            "COALESCE(g.title, '')), 'B') || "
+            "setweight(to_tsvector(%s::regconfig, "
+            "concat_ws(' ', u.first_name, u.last_name, u.username)), 'C') "
+            'FROM {post} p JOIN {user} u ON u.id = p.author_id '
+            'LEFT JOIN {group} g ON g.id = p.group_id'.format(**tables),
+            [config, config, config]
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_mediablob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def store_modes(apps, schema_editor):
+    # авторы, чьи записи уже подтягиваются при чтении, остаются в этом режиме
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        models.Q(followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS)
+        | models.Q(posts_count__gt=settings.TIMELINE_BACKFILL_POSTS)
+    ).update(timeline_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='timeline_pulled',
+            field=models.BooleanField(default=False, verbose_name='Без раскладки'),
+        ),
+        migrations.RunPython(store_modes, migrations.RunPython.noop),
+    ]
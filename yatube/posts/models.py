@@ -1,5 +1,12 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core.middleware import background_queries
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -22,6 +29,10 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -38,6 +49,7 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
 
@@ -45,7 +57,20 @@ class Post(models.Model):
         return self.text[:15]
 
     class Meta:
-        ordering = ["-pub_date"]
+        # id — второй ключ сортировки: порядок однозначен и совпадает
+        # с индексами лент
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'
+            ),
+            models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -73,6 +98,15 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -90,9 +124,268 @@ class Follow(models.Model):
 
     class Meta:
         ordering = ['-id']
-        models.UniqueConstraint(
-            fields=['user', 'author', ],
-            name='user_and_author_uniq'
-        )
+        # Уникальный индекс (user, author) обслуживает проверку подписки
+        # и ленту читателя, обратный (author, user) — подписчиков автора.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author', ],
+                name='user_and_author_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, разложенная при публикации (fan-out)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        db_index=False,
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Запись'
+    )
+    # копия Post.pub_date: страница ленты читается по индексу без posts_post
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_user_post_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class UserStatsManager(models.Manager):
+    def calculate(self, user_id):
+        """Считает показатели пользователя по исходным таблицам."""
+        return {
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'comments_count': Comment.objects.filter(
+                author_id=user_id
+            ).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+
+    def rebuild(self, user_id):
+        stats, _ = self.update_or_create(
+            user_id=user_id, defaults=self.calculate(user_id)
+        )
+        return stats
+
+    def for_user(self, user):
+        """Строка статистики пользователя; создаётся при первом обращении."""
+        try:
+            return user.stats
+        except UserStats.DoesNotExist:
+            # разовое восстановление строки не входит в бюджет запросов
+            # страницы (core.middleware)
+            with background_queries():
+                return self.rebuild(user.pk)
+
+    def change(self, user_id, **deltas):
+        """
+        Сдвигает счётчики на deltas одним UPDATE. Отсутствующая строка
+        при увеличении строится заново, при уменьшении не создаётся:
+        пользователь может удаляться каскадом.
+        """
+        updated = self.filter(user_id=user_id).update(**{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+        if not updated and any(delta > 0 for delta in deltas.values()):
+            self.rebuild(user_id)
+
+    def totals(self, user_ids=None):
+        """
+        {поле: {id пользователя: значение}} по исходным таблицам
+        для user_ids (для всех, если None) группирующими запросами.
+        """
+        counters = {
+            'posts_count': (Post.objects, 'author_id'),
+            'comments_count': (Comment.objects, 'author_id'),
+            'followers_count': (Follow.objects, 'author_id'),
+            'following_count': (Follow.objects, 'user_id'),
+        }
+        totals = {}
+        for field, (queryset, user_field) in counters.items():
+            if user_ids is not None:
+                queryset = queryset.filter(**{f'{user_field}__in': user_ids})
+            totals[field] = dict(queryset.order_by().values_list(
+                user_field
+            ).annotate(total=Count('id')))
+        return totals
+
+    def rebuild_many(self, user_ids, batch_size=1000):
+        """
+        Пересчитывает статистику пользователей user_ids пачками,
+        сохраняя режим их лент.
+        """
+        user_ids = sorted(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            totals = self.totals(batch)
+            existing = set(self.filter(user_id__in=batch).values_list(
+                'user_id', flat=True
+            ))
+            stats = [
+                UserStats(user_id=user_id, **{
+                    field: values.get(user_id, 0)
+                    for field, values in totals.items()
+                })
+                for user_id in batch
+            ]
+            self.bulk_update(
+                [item for item in stats if item.user_id in existing],
+                list(totals)
+            )
+            self.bulk_create(
+                [item for item in stats if item.user_id not in existing]
+            )
+
+    def rebuild_all(self, batch_size=1000):
+        """Пересчитывает статистику всех пользователей с нуля."""
+        totals = self.totals()
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        # режим ленты не выводится из счётчиков (см. posts.timeline)
+        pulled = set(self.filter(timeline_pulled=True).values_list(
+            'user_id', flat=True
+        ))
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for user_id in user_ids.iterator():
+                batch.append(UserStats(
+                    user_id=user_id, timeline_pulled=user_id in pulled, **{
+                        field: values.get(user_id, 0)
+                        for field, values in totals.items()
+                    }
+                ))
+                if len(batch) >= batch_size:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+        return self.count()
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # записи подтягиваются в ленты при чтении (см. posts.timeline)
+    timeline_pulled = models.BooleanField('Без раскладки', default=False)
+
+    objects = UserStatsManager()
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class MediaBlobManager(models.Manager):
+    def acquire(self, name, count=1):
+        """Добавляет count ссылок на файл name."""
+        if self.filter(name=name).update(
+            refcount=F('refcount') + count, updated=timezone.now()
+        ):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name, refcount=count)
+        except IntegrityError:
+            self.acquire(name, count)
+
+    def touch(self, name):
+        """
+        Отмечает файл name как только что записанный и блокирует его
+        строку до конца транзакции (см. gc_media).
+        """
+        if self.filter(name=name).update(updated=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name, refcount=0)
+        except IntegrityError:
+            self.touch(name)
+
+    def acquire_many(self, posts):
+        """Добавляет ссылки из картинок записей posts."""
+        totals = posts.exclude(image='').order_by().values_list(
+            'image'
+        ).annotate(total=Count('id'))
+        for name, total in totals.iterator():
+            self.acquire(name, total)
+
+    def release(self, name):
+        """Убирает ссылку на файл name; файл удалит gc_media."""
+        self.filter(name=name).update(
+            refcount=Greatest(F('refcount') - 1, 0), updated=timezone.now()
+        )
+
+    def rebuild_all(self):
+        """Пересчитывает ссылки по Post.image."""
+        totals = dict(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image'
+            ).annotate(total=Count('id'))
+        )
+        with transaction.atomic():
+            self.exclude(name__in=totals).update(refcount=0)
+            for name, total in totals.items():
+                self.update_or_create(
+                    name=name, defaults={'refcount': total}
+                )
+
+
+class MediaBlob(models.Model):
+    """Файл хранилища по содержимому и число ссылок на него."""
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField('Ссылок', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = MediaBlobManager()
+
+    def __str__(self) -> str:
+        return self.name
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
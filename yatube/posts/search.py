@@ -0,0 +1,199 @@
+"""
+Полнотекстовый поиск по записям.
+
+Документ записи — текст, название группы и имя автора. На PostgreSQL
+он хранится как tsvector в posts_post_search с GIN-индексом, на SQLite —
+в виртуальной таблице FTS5 posts_post_fts (rowid = id записи). Таблицы
+создаёт миграция 0012_post_search; внешних ключей на posts_post у них
+нет, поэтому поиск всегда соединяет их с записями. Индекс обновляется
+сигналами при сохранении и удалении записей, групп и авторов, целиком
+его перестраивает команда rebuild_search_index. На других базах поиск
+сводится к icontains по тем же полям.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Post
+
+WORD_RE = re.compile(r'\w+')
+
+
+def documents(post_ids):
+    """(id, текст, группа, автор) для индексации."""
+    rows = Post.objects.filter(pk__in=post_ids).order_by().values_list(
+        'id', 'text', 'group__title', 'author__first_name',
+        'author__last_name', 'author__username'
+    )
+    for pk, text, group, first_name, last_name, username in rows:
+        author = ' '.join(filter(None, (first_name, last_name, username)))
+        yield pk, text, group or '', author
+
+
+class SQLiteBackend:
+    table = 'posts_post_fts'
+    # веса столбцов text, group_title, author_name для bm25
+    weights = (1.0, 0.5, 0.25)
+
+    def write(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {self.table} '
+            '(rowid, text, group_title, author_name) VALUES (%s, %s, %s, %s)',
+            rows
+        )
+
+    def remove(self, cursor, post_ids):
+        cursor.executemany(
+            f'DELETE FROM {self.table} WHERE rowid = %s',
+            [(pk,) for pk in post_ids]
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+
+    def match(self, query):
+        # Каждое слово — отдельный префиксный терм, синтаксис FTS5
+        # из пользовательского ввода не попадает в запрос
+        return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+    def filter(self, queryset, query):
+        weights = ', '.join(map(str, self.weights))
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = posts_post.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[self.match(query)],
+            select={'rank': f'-bm25({self.table}, {weights})'},
+            order_by=['-rank', '-pub_date', '-id'],
+        )
+
+
+class PostgresBackend:
+    table = 'posts_post_search'
+    document = (
+        "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'C')"
+    )
+
+    def write(self, cursor, rows):
+        config = settings.SEARCH_CONFIG
+        cursor.executemany(
+            f'INSERT INTO {self.table} (post_id, document) '
+            f'VALUES (%s, {self.document}) '
+            'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+            [
+                (pk, config, text, config, group, config, author)
+                for pk, text, group, author in rows
+            ]
+        )
+
+    def remove(self, cursor, post_ids):
+        cursor.execute(
+            f'DELETE FROM {self.table} WHERE post_id = ANY(%s)',
+            [list(post_ids)]
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {self.table}')
+
+    def filter(self, queryset, query):
+        tsquery = 'plainto_tsquery(%s::regconfig, %s)'
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table}.post_id = posts_post.id',
+                f'{self.table}.document @@ {tsquery}',
+            ],
+            params=[settings.SEARCH_CONFIG, query],
+            select={'rank': f'ts_rank({self.table}.document, {tsquery})'},
+            select_params=[settings.SEARCH_CONFIG, query],
+            order_by=['-rank', '-pub_date', '-id'],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend():
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend is not None else None
+
+
+def update_posts(post_ids):
+    """Переиндексирует записи post_ids."""
+    backend = get_backend()
+    post_ids = list(post_ids)
+    if backend is None or not post_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, post_ids)
+        backend.write(cursor, list(documents(post_ids)))
+
+
+def update_many(post_ids, batch_size=1000):
+    """update_posts для итератора post_ids пачками по batch_size."""
+    batch = []
+    for pk in post_ids:
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            update_posts(batch)
+            batch = []
+    update_posts(batch)
+
+
+def remove_posts(post_ids):
+    backend = get_backend()
+    post_ids = list(post_ids)
+    if backend is None or not post_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, post_ids)
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Строит индекс заново; возвращает число записей."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    post_ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        batch = []
+        for pk in post_ids.iterator():
+            batch.append(pk)
+            if len(batch) >= batch_size:
+                backend.write(cursor, list(documents(batch)))
+                total += len(batch)
+                batch = []
+        backend.write(cursor, list(documents(batch)))
+        total += len(batch)
+    return total
+
+
+def filter_posts(queryset, query):
+    """Записи queryset, подходящие под query, от более релевантных."""
+    if not WORD_RE.search(query):
+        return queryset.none()
+    backend = get_backend()
+    if backend is not None:
+        return backend.filter(queryset, query)
+    condition = Q()
+    for word in WORD_RE.findall(query):
+        condition &= (
+            Q(text__icontains=word)
+            | Q(group__title__icontains=word)
+            | Q(author__username__icontains=word)
+            | Q(author__first_name__icontains=word)
+            | Q(author__last_name__icontains=word)
+        )
+    return queryset.filter(condition)
@@ -0,0 +1,222 @@
+"""
+Синтетические данные для нагрузочных замеров.
+
+Авторы записей выбираются по закону Ципфа: автор с рангом k пишет
+пропорционально 1 / k^s, поэтому, как на живом сайте, немногие авторы
+дают большую часть записей и собирают больше всего подписчиков.
+Тексты берутся из небольшого заранее сгенерированного Faker набора,
+объекты вставляются bulk_create с заранее назначенными id, а данные,
+которые обычно поддерживают сигналы (статистика, ленты подписок,
+поисковый индекс), строятся в конце только для созданных объектов
+теми же пакетными запросами, что и после import_posts.
+"""
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.utils import timezone
+from faker import Faker
+
+from . import cache
+from .models import Comment, Follow, Group, Post, User
+from .transfer import (
+    keep_timestamps, next_free_id, rebuild_derived, reset_sequences,
+)
+
+TEXT_POOL_SIZE = 1000
+# записи распределяются по этому отрезку времени до текущего момента
+PERIOD = timedelta(days=365)
+
+
+class SeedError(Exception):
+    pass
+
+
+class Seeder:
+    def __init__(self, batch_size=5000, zipf=1.1, seed=None):
+        self.batch_size = batch_size
+        self.zipf = zipf
+        self.random = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.now = timezone.now()
+
+    def texts(self, size):
+        return [
+            self.fake.text(max_nb_chars=size)
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+
+    def zipf_weights(self, count):
+        return list(accumulate(
+            1 / rank ** self.zipf for rank in range(1, count + 1)
+        ))
+
+    def insert(self, model, objects):
+        """Вставляет объекты пачками; возвращает их количество."""
+        total = 0
+        batch = []
+        with keep_timestamps(model):
+            for obj in objects:
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    model.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+        return total + len(batch)
+
+    def check(self, users, groups, posts, comments, follows):
+        counts = {
+            'users': users, 'groups': groups, 'posts': posts,
+            'comments': comments, 'follows': follows,
+            'batch_size': self.batch_size,
+        }
+        for name, count in counts.items():
+            if count < 0:
+                raise SeedError(f'{name} не может быть отрицательным.')
+        if self.batch_size == 0:
+            raise SeedError('batch_size должен быть больше нуля.')
+        if posts and not users:
+            raise SeedError('Для записей нужен хотя бы один пользователь.')
+        if comments and not posts:
+            raise SeedError('Для комментариев нужна хотя бы одна запись.')
+
+    def create_users(self, count):
+        first_id = next_free_id(User)
+        self.insert(User, (
+            User(
+                pk=first_id + i,
+                username=f'{self.fake.user_name()}_{first_id + i}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                date_joined=self.now - PERIOD,
+            )
+            for i in range(count)
+        ))
+        return list(range(first_id, first_id + count))
+
+    def create_groups(self, count):
+        first_id = next_free_id(Group)
+        self.insert(Group, (
+            Group(
+                pk=first_id + i,
+                title=self.fake.catch_phrase()[:200],
+                slug=f'group-{first_id + i}',
+                description=self.fake.paragraph(),
+            )
+            for i in range(count)
+        ))
+        return list(range(first_id, first_id + count))
+
+    def pub_date(self, index, count):
+        """
+        Дата записи с номером index: записи идут по времени, как id,
+        равномерно по PERIOD. Комментарии вычисляют её заново.
+        """
+        return self.now - PERIOD + PERIOD * (index + 1) / count
+
+    def create_posts(self, count, author_ids, group_ids):
+        """Записи; возвращает id первой."""
+        first_id = next_free_id(Post)
+        weights = self.zipf_weights(len(author_ids))
+        texts = self.texts(400)
+
+        def build():
+            for i in range(count):
+                author_id, = self.random.choices(
+                    author_ids, cum_weights=weights
+                )
+                pub_date = self.pub_date(i, count)
+                yield Post(
+                    pk=first_id + i,
+                    author_id=author_id,
+                    group_id=(
+                        self.random.choice(group_ids)
+                        if group_ids and self.random.random() < 0.7
+                        else None
+                    ),
+                    text=self.random.choice(texts),
+                    pub_date=pub_date,
+                    updated=pub_date,
+                )
+
+        self.insert(Post, build())
+        return first_id
+
+    def create_comments(self, count, first_post_id, posts, user_ids):
+        if not posts:
+            return 0
+        # чаще комментируют свежие записи: ранг 1 — последняя
+        weights = self.zipf_weights(posts)
+        texts = self.texts(150)
+
+        def build():
+            for _ in range(count):
+                rank, = self.random.choices(
+                    range(posts), cum_weights=weights
+                )
+                index = posts - 1 - rank
+                yield Comment(
+                    post_id=first_post_id + index,
+                    author_id=self.random.choice(user_ids),
+                    text=self.random.choice(texts),
+                    created=min(
+                        self.now,
+                        self.pub_date(index, posts) + timedelta(
+                            hours=self.random.expovariate(1 / 24)
+                        )
+                    ),
+                )
+
+        return self.insert(Comment, build())
+
+    def create_follows(self, per_user, user_ids, author_ids):
+        weights = self.zipf_weights(len(author_ids))
+        per_user = min(per_user, len(author_ids) - 1)
+
+        def build():
+            for user_id in user_ids:
+                followed = set()
+                while len(followed) < per_user:
+                    author_id, = self.random.choices(
+                        author_ids, cum_weights=weights
+                    )
+                    if author_id != user_id:
+                        followed.add(author_id)
+                for author_id in followed:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        return self.insert(Follow, build())
+
+    def run(self, users, groups, posts, comments, follows):
+        """
+        Создаёт данные; возвращает {модель: количество}. Неверные
+        количества (записи без пользователей и т. п.) — SeedError.
+        """
+        self.check(users, groups, posts, comments, follows)
+        first_ids = {
+            'user': next_free_id(User),
+            'post': next_free_id(Post),
+            'comment': next_free_id(Comment),
+            'follow': next_free_id(Follow),
+        }
+        user_ids = self.create_users(users)
+        group_ids = self.create_groups(groups)
+        # авторы — случайная перестановка пользователей: ранги Ципфа
+        # не совпадают с порядком id
+        author_ids = self.random.sample(user_ids, len(user_ids))
+        first_post_id = self.create_posts(posts, author_ids, group_ids)
+        totals = {
+            'user': users,
+            'group': groups,
+            'post': posts,
+            'comment': self.create_comments(
+                comments, first_post_id, posts, user_ids
+            ),
+            'follow': self.create_follows(follows, user_ids, author_ids),
+        }
+        reset_sequences([User, Group, Post, Comment, Follow])
+        rebuild_derived(first_ids, self.batch_size)
+        cache.bump(cache.ALL)
+        return totals
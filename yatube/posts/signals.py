@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cache, images, search, thumbnails, timeline
+from .models import (
+    Comment, Follow, Group, MediaBlob, Post, User, UserStats
+)
+
+# поля пользователя, из которых состоит имя автора в поисковом индексе
+SEARCH_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, posts_count=-1)
+    timeline.update_mode(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.change(instance.user_id, following_count=1)
+        UserStats.objects.change(instance.author_id, followers_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.objects.change(instance.user_id, following_count=-1)
+    UserStats.objects.change(instance.author_id, followers_count=-1)
+    timeline.trim(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_previous(sender, instance, **kwargs):
+    # При правке запись может уйти из группы: её страницу тоже сбрасываем;
+    # сменённая картинка теряет ссылку
+    previous = Post.objects.filter(pk=instance.pk).order_by().values(
+        'group_id', 'image'
+    ).first() if instance.pk else None
+    previous = previous or {}
+    instance._previous_group_id = previous.get('group_id')
+    instance._previous_image = previous.get('image') or ''
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_invalidate_pages(sender, instance, **kwargs):
+    cache.bump(
+        cache.ALL,
+        cache.author_scope(instance.author_id),
+        cache.group_scope(instance.group_id),
+        cache.group_scope(getattr(instance, '_previous_group_id', None)),
+        cache.post_scope(instance.pk),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_invalidate_pages(sender, instance, **kwargs):
+    cache.bump(cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_invalidate_pages(sender, instance, **kwargs):
+    cache.bump(cache.ALL, cache.group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_invalidate_pages(sender, instance, **kwargs):
+    cache.bump(cache.author_scope(instance.author_id))
+
+
+@receiver(post_save, sender=Post)
+def post_count_image_reference(sender, instance, created, **kwargs):
+    previous = '' if created else getattr(instance, '_previous_image', '')
+    if instance.image.name == previous:
+        return
+    if instance.image:
+        MediaBlob.objects.acquire(instance.image.name)
+    if previous:
+        MediaBlob.objects.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def post_release_image(sender, instance, **kwargs):
+    if instance.image:
+        MediaBlob.objects.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def post_pregenerate_thumbnails(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(
+            lambda: thumbnails.pregenerate(instance.image)
+        )
+        transaction.on_commit(
+            lambda: images.schedule_variants(instance.image.name)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_update_search(sender, instance, **kwargs):
+    search.update_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def post_remove_search(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def group_update_search(sender, instance, created, **kwargs):
+    if not created:
+        search.update_posts(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def group_remember_posts(sender, instance, **kwargs):
+    # после удаления у записей будет group=NULL, и их уже не найти
+    instance._post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def group_remove_search(sender, instance, **kwargs):
+    search.update_posts(getattr(instance, '_post_ids', []))
+
+
+@receiver(post_save, sender=User)
+def user_update_search(sender, instance, created, update_fields, **kwargs):
+    # вход пользователя сохраняет только last_login
+    if created or update_fields and not SEARCH_USER_FIELDS & update_fields:
+        return
+    search.update_posts(instance.posts.values_list('pk', flat=True))
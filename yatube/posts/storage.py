@@ -0,0 +1,69 @@
+"""
+Хранилище картинок записей по содержимому.
+
+Имя файла — SHA-256 его содержимого, посчитанный во время записи:
+одинаковые загрузки хранятся одним файлом posts/ab/abcd….jpg, а
+миниатюры sorl и варианты из posts.images, которые именуются по имени
+исходника, получаются общими для всех записей с этой картинкой.
+Ссылки из Post.image считает MediaBlob, неиспользуемые файлы удаляет
+команда gc_media. Запись файла и его удаление сборщиком идут под
+блокировкой строки MediaBlob: загрузка той же картинки не может
+переиспользовать файл, который gc_media как раз удаляет.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+def blob_name(directory, digest, extension):
+    return '/'.join(
+        part for part in (directory, digest[:2], digest + extension) if part
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяет содержимое, см. _save
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        descriptor, temporary = tempfile.mkstemp(
+            prefix='.upload-', dir=self.location
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                locks.lock(output, locks.LOCK_EX)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            name = blob_name(directory, digest.hexdigest(), extension)
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            media_blob = apps.get_model('posts', 'MediaBlob')
+            with transaction.atomic():
+                # наличие файла проверяется под блокировкой строки
+                media_blob.objects.touch(name)
+                if os.path.exists(path):
+                    os.remove(temporary)
+                else:
+                    os.replace(temporary, path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import chrome as page_chrome
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def chrome(context, name, *args):
+    """
+    Кусок страницы, зависящий от пользователя: {% chrome "имя" аргументы %}.
+    На кешируемой странице — заглушка, которую заполнит posts.chrome.fill().
+    """
+    request = context['request']
+    if page_chrome.is_deferred(request):
+        return mark_safe(page_chrome.placeholder(name, args))
+    return mark_safe(page_chrome.render(request, name, args))
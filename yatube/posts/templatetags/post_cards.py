@@ -0,0 +1,60 @@
+import time
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.fragments import card_key, card_rendered, collect_placeholders
+
+register = template.Library()
+
+
+class CardCacheNode(template.Node):
+    def __init__(self, nodelist, post, vary_on):
+        self.nodelist = nodelist
+        self.post = post
+        self.vary_on = vary_on
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        key = card_key(post, vary_on)
+        cached = cache.get(key)
+        if cached is not None:
+            html, render_time = cached
+            card_rendered.send(
+                sender=self.__class__, hit=True, render_time=render_time
+            )
+            return html
+        started = time.perf_counter()
+        with collect_placeholders() as found:
+            html = self.nodelist.render(context)
+        render_time = time.perf_counter() - started
+        if not found:
+            cache.set(key, (html, render_time), settings.CARD_CACHE_TIMEOUT)
+        card_rendered.send(
+            sender=self.__class__, hit=False, render_time=render_time
+        )
+        return html
+
+
+@register.tag
+def cardcache(parser, token):
+    """
+    Кеширует карточку записи:
+    {% cardcache post [переменные, от которых зависит разметка] %}
+    ...
+    {% endcardcache %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' ожидает запись первым аргументом"
+        )
+    nodelist = parser.parse(('endcardcache',))
+    parser.delete_first_token()
+    return CardCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
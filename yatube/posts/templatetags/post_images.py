@@ -0,0 +1,23 @@
+from django import template
+from django.conf import settings
+
+from posts import images
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/picture.html')
+def picture(image, fallback):
+    """
+    <picture> с вариантами картинки разных ширин и форматов;
+    fallback — миниатюра sorl для <img src>.
+    """
+    sources = images.get_sources(image.name)
+    return {
+        'fallback': fallback,
+        'sources': [s for s in sources if s['format'] != 'JPEG'],
+        'srcset': next(
+            (s['srcset'] for s in sources if s['format'] == 'JPEG'), ''
+        ),
+        'sizes': settings.IMAGE_VARIANT_SIZES,
+    }
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, text='Тестовая запись', group=self.group
+        )
+        self.client = Client()
+
+    def test_feeds_return_posts(self):
+        """Ленты отдают записи в JSON"""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('api:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                data = response.json()
+                self.assertEqual(
+                    [post['text'] for post in data['results']],
+                    ['Тестовая запись']
+                )
+                self.assertEqual(data['results'][0]['group'], 'test_slug')
+                self.assertIsNone(data['next'])
+
+    def test_post_detail_with_comments(self):
+        """Запись отдаётся вместе с комментариями"""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        response = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        data = response.json()
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['Комментарий']
+        )
+
+    def test_unchanged_feed_returns_304(self):
+        """Повторный запрос с валидаторами получает 304 до новой записи"""
+        url = reverse('api:index')
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 304
+        )
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code, 304
+        )
+        Post.objects.create(author=self.author, text='Новая запись')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 200
+        )
+
+    def test_new_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag записи"""
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок доступна только авторизованному"""
+        url = reverse('api:follow_index')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        data = self.client.get(url).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']], [self.post.pk]
+        )
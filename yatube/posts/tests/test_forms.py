@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from io import BytesIO
 from django.conf import settings
 from http import HTTPStatus
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -8,6 +9,7 @@ from posts.models import Post, Group
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from PIL import Image
 
 User = get_user_model()
 
@@ -142,3 +144,77 @@ class PostCreateFormTests(TestCase):
             f'{reverse("users:login")}?next={url_edit}'
         )
         self.assertEqual(Post.objects.count(), 1)
+
+
+def make_jpeg(size, exif=None):
+    file_obj = BytesIO()
+    image = Image.new('RGB', size, color=(30, 120, 200))
+    if exif is not None:
+        image.save(file_obj, 'JPEG', exif=exif)
+    else:
+        image.save(file_obj, 'JPEG')
+    return file_obj.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, content, name='photo.jpg'):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Запись с фото',
+                'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+            },
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=500)
+    def test_image_is_downsized_and_stripped(self):
+        """Картинка уменьшается и сохраняется без EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        self.upload(make_jpeg((2000, 1000), exif=exif))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (500, 250))
+            self.assertNotIn('exif', image.info)
+
+    def test_png_is_stripped(self):
+        """Метаданные из PNG тоже не сохраняются"""
+        exif = Image.Exif()
+        exif[0x0110] = 'SecretCam'
+        file_obj = BytesIO()
+        Image.new('RGB', (100, 100)).save(file_obj, 'PNG', exif=exif)
+        self.assertIn(b'SecretCam', file_obj.getvalue())
+        self.upload(file_obj.getvalue(), name='photo.png')
+        post = Post.objects.get()
+        with open(post.image.path, 'rb') as stored:
+            self.assertNotIn(b'SecretCam', stored.read())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_oversized_file_is_rejected(self):
+        """Файл больше лимита отклоняется формой"""
+        response = self.upload(make_jpeg((600, 600)) + b'\0' * 2048)
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error('image'))
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100)
+    def test_too_many_pixels_is_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку"""
+        response = self.upload(make_jpeg((20, 20)))
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error('image'))
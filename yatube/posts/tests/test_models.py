@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -28,3 +32,91 @@ class PostModelTest(TestCase):
 
         group = PostModelTest.group
         self.assertEqual(group.title, str(group))
+
+
+class UserStatsModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей"""
+        post = Post.objects.create(author=self.user, text='Запись')
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        author_stats = self.get_stats(self.user)
+        reader_stats = self.get_stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+
+        follow.delete()
+        post.delete()
+        author_stats = self.get_stats(self.user)
+        reader_stats = self.get_stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+
+    def test_rebuild_command_restores_counters(self):
+        """Команда rebuild_user_stats пересчитывает счётчики с нуля"""
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Запись {i}') for i in range(3)]
+        )
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(self.get_stats(self.user).posts_count, 3)
+        self.assertEqual(self.get_stats(self.reader).posts_count, 0)
+
+
+class PostFeedIndexTest(TestCase):
+    """Ленты сортируются по составным индексам, а не сортировкой в памяти."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([
+            Post(author=cls.user, group=cls.group, text=f'Запись {i}')
+            for i in range(20)
+        ])
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET enable_seqscan')
+        return queryset.explain()
+
+    def test_feeds_use_composite_indexes(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('EXPLAIN проверяется только на SQLite и Postgres')
+        feeds = (
+            (Post.objects.all(), 'post_feed_idx'),
+            (self.group.posts.all(), 'post_group_feed_idx'),
+            (self.user.posts.all(), 'post_author_feed_idx'),
+        )
+        for queryset, index_name in feeds:
+            with self.subTest(index_name=index_name):
+                plan = self.explain(
+                    queryset.select_related('author', 'group')[:10]
+                )
+                self.assertIn(index_name, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotIn('Sort', plan)
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Post, TimelineEntry, UserStats
+from posts.seed import Seeder
+
+User = get_user_model()
+
+
+class SeedLoadTest(TestCase):
+    def test_seeded_data_is_consistent(self):
+        """Сгенерированные данные согласованы с производными таблицами"""
+        totals = Seeder(batch_size=50, seed=1).run(
+            users=30, groups=3, posts=300, comments=200, follows=5
+        )
+        self.assertEqual(totals['post'], Post.objects.count())
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 30 * 5)
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')
+        ).exists())
+        for stats in UserStats.objects.all():
+            self.assertEqual(
+                stats.posts_count, stats.user.posts.count()
+            )
+        self.assertTrue(TimelineEntry.objects.exists())
+        # закон Ципфа: самый плодовитый автор пишет больше среднего
+        counts = sorted(Post.objects.order_by().values('author').annotate(
+            total=Count('id')
+        ).values_list('total', flat=True), reverse=True)
+        self.assertGreater(counts[0], 3 * 300 / 30)
+        created = Post.objects.create(
+            author=User.objects.first(), text='Новая'
+        )
+        self.assertEqual(created.pk, 301)
+
+    def test_seed_load_command(self):
+        """seed_load создаёт заданное количество объектов"""
+        out = StringIO()
+        call_command(
+            'seed_load', users=5, groups=1, posts=20, comments=10,
+            follows_per_user=2, seed=1, stdout=out
+        )
+        self.assertIn('post: 20', out.getvalue())
+        self.assertEqual(Post.objects.count(), 20)
+
+    def test_invalid_counts_are_rejected(self):
+        """Записи без пользователей и отрицательные количества — ошибка"""
+        for options in (
+            {'users': 0, 'posts': 10},
+            {'posts': 0, 'comments': 10},
+            {'groups': -1},
+            {'batch_size': 0},
+        ):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    call_command(
+                        'seed_load', **{
+                            'users': 5, 'groups': 1, 'posts': 20,
+                            'comments': 10, **options
+                        }, stdout=StringIO()
+                    )
+        self.assertFalse(User.objects.exists())
+
+
+class BenchmarkViewsTest(TestCase):
+    def test_results_are_stored_and_compared(self):
+        """Результаты замеров сохраняются и сравниваются с прошлыми"""
+        path = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        self.addCleanup(os.remove, path)
+        call_command(
+            'benchmark_views', sizes=[40], requests=2, output=path,
+            stdout=StringIO()
+        )
+        with open(path, encoding='utf-8') as stream:
+            results = json.load(stream)['results']
+        self.assertEqual(
+            [result['view'] for result in results],
+            ['index', 'group_posts', 'profile', 'post_detail',
+             'follow_index']
+        )
+        self.assertTrue(all(result['queries'] > 0 for result in results))
+        # данные замеров откатываются
+        self.assertFalse(Post.objects.exists())
+        out = StringIO()
+        call_command(
+            'benchmark_views', sizes=[40], requests=2, compare=path,
+            stdout=out
+        )
+        self.assertIn('p50 ', out.getvalue())
+        self.assertIn('запросов было', out.getvalue())
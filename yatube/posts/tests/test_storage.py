@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts.models import MediaBlob, Post
+from posts.tests.test_thumbnails import make_image
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, image):
+        return Post.objects.create(
+            author=self.user, text='Запись с картинкой', image=image
+        )
+
+    def refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом с именем по SHA-256"""
+        first = self.create_post(make_image('first.png'))
+        second = self.create_post(make_image('second.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.png$'
+        )
+        self.assertEqual(self.refcount(first.image.name), 2)
+        other = self.create_post(make_image('other.png', size=(640, 480)))
+        self.assertNotEqual(other.image.name, first.image.name)
+
+    def test_references_follow_posts(self):
+        """Счётчик ссылок меняется при правке и удалении записей"""
+        first = self.create_post(make_image())
+        second = self.create_post(make_image())
+        name = first.image.name
+        second.image = make_image(size=(640, 480))
+        second.save()
+        self.assertEqual(self.refcount(name), 1)
+        self.assertEqual(self.refcount(second.image.name), 1)
+        first.delete()
+        self.assertEqual(self.refcount(name), 0)
+
+    def test_gc_removes_unreferenced_files(self):
+        """gc_media удаляет файлы без ссылок и оставляет используемые"""
+        kept = self.create_post(make_image())
+        removed = self.create_post(make_image(size=(640, 480)))
+        name = removed.image.name
+        path = removed.image.path
+        removed.delete()
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertEqual(self.refcount(kept.image.name), 1)
+
+    def test_gc_keeps_file_uploaded_again(self):
+        """gc_media не удаляет файл, который только что загрузили снова"""
+        removed = self.create_post(make_image(size=(640, 480)))
+        name = removed.image.name
+        path = removed.image.path
+        removed.delete()
+        MediaBlob.objects.filter(name=name).update(
+            updated=timezone.now() - timedelta(days=1)
+        )
+        # форма сохранила ту же картинку, но запись ещё не создана
+        storage = Post._meta.get_field('image').storage
+        self.assertEqual(
+            storage.save('posts/again.png', make_image(size=(640, 480))),
+            name
+        )
+        call_command('gc_media', grace=60, stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+
+    def test_gc_dry_run_changes_nothing(self):
+        """gc_media --dry-run не удаляет файлы и не чинит счётчики"""
+        post = self.create_post(make_image(size=(320, 240)))
+        MediaBlob.objects.filter(name=post.image.name).update(refcount=0)
+        call_command('gc_media', grace=0, dry_run=True, stdout=StringIO())
+        self.assertEqual(self.refcount(post.image.name), 0)
+        self.assertTrue(os.path.exists(post.image.path))
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertEqual(self.refcount(post.image.name), 1)
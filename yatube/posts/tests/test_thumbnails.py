@@ -0,0 +1,165 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts import images, thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='photo.png', size=(1200, 800)):
+    file_obj = BytesIO()
+    Image.new('RGB', size, color=(200, 30, 30)).save(file_obj, 'PNG')
+    return SimpleUploadedFile(
+        name=name, content=file_obj.getvalue(), content_type='image/png'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class AsyncThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='Запись с картинкой', image=make_image()
+        )
+
+    def test_missing_thumbnail_serves_original(self):
+        """Пока миниатюры нет, отдаётся исходная картинка"""
+        image = default.backend.get_thumbnail(
+            self.post.image, '960x339', crop='center', upscale=True
+        )
+        self.assertEqual(image.url, self.post.image.url)
+
+    def test_ready_thumbnail_is_served_from_kvstore(self):
+        """Подготовленная миниатюра берётся из kvstore без обработки"""
+        thumbnails.pregenerate(self.post.image)
+        image = default.backend.get_thumbnail(
+            self.post.image, '960x339', crop='center', upscale=True
+        )
+        self.assertNotEqual(image.url, self.post.image.url)
+        self.assertEqual((image.width, image.height), (960, 339))
+
+    def test_page_renders_without_waiting_for_thumbnail(self):
+        """Страница отдаёт исходную картинку до готовности миниатюры"""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='Запись с картинкой', image=make_image()
+        )
+
+    def test_variants_have_deterministic_names(self):
+        """Варианты всех ширин и форматов лежат под предсказуемыми именами"""
+        images.build_variants(self.post.image.name)
+        for image_format in images.supported_formats():
+            for width in settings.IMAGE_VARIANT_WIDTHS:
+                name = images.variant_name(
+                    self.post.image.name, width, image_format
+                )
+                self.assertTrue(default_storage.exists(name))
+                with default_storage.open(name) as variant:
+                    self.assertEqual(
+                        Image.open(variant).size, images.variant_size(width)
+                    )
+
+    def test_sources_are_cached(self):
+        """Готовый список вариантов берётся из кеша без обращения к диску"""
+        images.build_variants(self.post.image.name)
+        images.get_sources(self.post.image.name)
+        with mock.patch.object(default_storage, 'exists') as exists:
+            sources = images.get_sources(self.post.image.name)
+        exists.assert_not_called()
+        self.assertEqual(
+            [source['format'] for source in sources],
+            images.supported_formats()
+        )
+
+    def test_page_contains_srcset(self):
+        """Карточка записи отдаёт srcset и sizes"""
+        images.build_variants(self.post.image.name)
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, settings.IMAGE_VARIANT_SIZES)
+        self.assertContains(response, '-480w.jpg 480w')
+
+    def test_card_with_placeholder_is_not_cached(self):
+        """Карточка кешируется только с готовыми миниатюрой и вариантами"""
+        url = reverse('posts:index')
+        self.assertNotContains(Client().get(url), 'srcset=')
+        thumbnails.pregenerate(self.post.image)
+        images.build_variants(self.post.image.name)
+        response = Client().get(url)
+        self.assertContains(response, 'srcset=')
+        self.assertNotContains(response, f'src="{self.post.image.url}"')
+
+    def test_page_with_placeholder_is_not_cached(self):
+        """Страница записи кешируется только с готовыми картинками"""
+        # пул занят: миниатюра и варианты ещё не готовы
+        with mock.patch.object(thumbnails, 'submit'):
+            post = Post.objects.create(
+                author=self.user, text='Новая картинка',
+                image=make_image(size=(1000, 700))
+            )
+            url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            response = Client().get(url)
+        self.assertNotContains(response, 'srcset=')
+        self.assertContains(response, f'src="{post.image.url}"')
+        thumbnails.pregenerate(post.image)
+        images.build_variants(post.image.name)
+        response = Client().get(url)
+        self.assertContains(response, 'srcset=')
+        self.assertNotContains(response, f'src="{post.image.url}"')
+
+
+class ThumbnailWorkerTest(SimpleTestCase):
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_worker_closes_connections_after_failed_job(self):
+        """Поток пула закрывает свои соединения и после ошибки задачи"""
+        def broken():
+            raise ValueError('Сломанная картинка')
+
+        with mock.patch.object(
+            thumbnails.connections, 'close_all'
+        ) as close_all, self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.submit('broken', broken)
+            thumbnails.wait(timeout=5)
+        close_all.assert_called_once_with()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import search
+from posts.models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats
+)
+
+User = get_user_model()
+
+
+class TransferCommandsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Старая запись'
+        )
+        self.pub_date = timezone.now() - timedelta(days=30)
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=self.pub_date, updated=self.pub_date
+        )
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self):
+        path = os.path.join(tempfile.mkdtemp(), 'posts.ndjson.gz')
+        self.addCleanup(os.remove, path)
+        call_command('export_posts', path, stdout=StringIO())
+        return path
+
+    def test_round_trip_into_empty_database(self):
+        """Загрузка восстанавливает объекты, связи и даты"""
+        path = self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command('import_posts', path, batch_size=1, stdout=StringIO())
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Старая запись')
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.author.username, 'author')
+        self.assertEqual(post.group.slug, 'test_slug')
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.author.username, 'reader')
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author=post.author
+        ).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=post.author).posts_count, 1
+        )
+        self.assertEqual(
+            list(search.filter_posts(Post.objects.all(), 'старая')), [post]
+        )
+
+    def test_existing_users_and_groups_are_reused(self):
+        """Пользователи и группы с теми же именами не дублируются"""
+        path = self.export()
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(self.author.posts.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        # производные данные дополнены для загруженных записей
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        created = Post.objects.create(author=self.author, text='Новая')
+        self.assertGreater(created.pk, Post.objects.exclude(
+            pk=created.pk
+        ).order_by('-pk').first().pk)
+
+    def test_broken_reference_is_rejected(self):
+        """Ссылка на отсутствующий объект прерывает загрузку целиком"""
+        path = os.path.join(tempfile.mkdtemp(), 'broken.ndjson')
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(
+                '{"model": "group", "pk": 7, "fields": {"title": "Новая", '
+                '"slug": "new", "description": ""}}\n'
+                '{"model": "post", "pk": 1, "fields": {"text": "Текст", '
+                '"author_id": 999, "group_id": 7}}\n'
+            )
+        with self.assertRaises(CommandError):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(Group.objects.filter(slug='new').exists())
+
+    def test_reference_to_skipped_id_is_rejected(self):
+        """Ссылка на id, которого нет в файле, прерывает загрузку"""
+        path = os.path.join(tempfile.mkdtemp(), 'gap.ndjson')
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(
+                '{"model": "user", "pk": 10, "fields": '
+                '{"username": "first", "password": ""}}\n'
+                '{"model": "user", "pk": 12, "fields": '
+                '{"username": "second", "password": ""}}\n'
+                '{"model": "post", "pk": 1, "fields": {"text": "Текст", '
+                '"pub_date": "2024-01-01T00:00:00+00:00", '
+                '"updated": "2024-01-01T00:00:00+00:00", '
+                '"author_id": 11}}\n'
+            )
+        with self.assertRaises(CommandError):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='first').exists())
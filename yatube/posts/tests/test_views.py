@@ -1,14 +1,29 @@
+import json
 import shutil
 import tempfile
+from urllib.parse import urlencode
+
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
+from core.middleware import (
+    QueryBudgetExceeded, QueryMetricsMiddleware, RequestMetrics,
+    background_queries
+)
+from posts import timeline
+from posts.cache import ALL, bump
 from posts.forms import PostForm
-from posts.models import Post, Group, Comment, Follow
+from posts.fragments import stats as card_stats
+from posts.models import (
+    Post, Group, Comment, Follow, TimelineEntry, UserStats
+)
+from posts.utils import CountedPaginator
 
 User = get_user_model()
 
@@ -119,7 +134,8 @@ class GroupPagesTests(TestCase):
             reverse('posts:post_detail', kwargs={'post_id': 1})))
         object = response.context['post_detail']
         self.assertEqual(object.text, self.post.text)
-        self.assertEqual(object.image, 'posts/small.gif')
+        self.assertEqual(object.image, self.post.image.name)
+        self.assertRegex(object.image.name, r'^posts/.+\.gif$')
 
     def test_post_edit_page_show_correct_context(self):
         """Шаблон post_edit сформирован с правильным контекстом."""
@@ -309,6 +325,80 @@ class PaginatorViewsTest(TestCase):
                 )
 
 
+@override_settings(CURSOR_PAGINATION_VIEWS=[
+    'posts:index', 'posts:group_list', 'posts:profile',
+])
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        Post.objects.bulk_create([Post(
+            text=f'Текст для проверки {i}',
+            author=cls.user,
+            group=cls.group,
+        ) for i in range(13)])
+        cls.list_template_names = {
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'testuser'}),
+        }
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры ведут на следующую и обратно на первую страницу"""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for reverse_name in self.list_template_names:
+            with self.subTest(reverse_name=reverse_name):
+                first = self.authorized_client.get(reverse_name)
+                first_page = first.context['page_obj']
+                self.assertEqual(list(first_page), expected[:10])
+                self.assertFalse(first_page.has_previous())
+                self.assertContains(first, '?cursor=')
+
+                second_page = self.authorized_client.get(
+                    reverse_name, {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(second_page), expected[10:])
+                self.assertFalse(second_page.has_next())
+
+                back_page = self.authorized_client.get(
+                    reverse_name, {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back_page), expected[:10])
+                self.assertFalse(back_page.has_previous())
+
+    def test_cursor_page_skips_count_query(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        first_page = self.authorized_client.get(
+            reverse('posts:index')
+        ).context['page_obj']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(
+                reverse('posts:index'), {'cursor': first_page.next_cursor}
+            )
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор ведёт на первую страницу"""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
 class IndexPageCacheTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -334,11 +424,8 @@ class IndexPageCacheTest(TestCase):
     def test_index_page_cache(self):
         """Проверка кеширования главной страницы"""
         response_one_post = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.create(
-            author=self.user,
-            text='Запись №2',
-            group=self.group,
-        )
+        # изменение в обход сигналов не сбрасывает кеш
+        Post.objects.filter(pk=self.post.pk).update(text='Запись №2')
         response_cached = self.authorized_client.get(reverse('posts:index'))
         # страница не изменилась
         self.assertEqual(response_one_post.content, response_cached.content)
@@ -348,6 +435,49 @@ class IndexPageCacheTest(TestCase):
         )
         self.assertNotEqual(response_one_post.content, response.content)
 
+    def test_new_post_invalidates_cached_pages(self):
+        """Новая запись сразу видна на закешированных страницах"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'testuser'}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=self.user,
+            text='Запись №2',
+            group=self.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Запись №2')
+
+    def test_cached_page_is_not_shared_between_users(self):
+        """Закешированная страница не отдаётся другому пользователю"""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        follower_client = Client()
+        follower_client.force_login(follower)
+        url = reverse('posts:profile', kwargs={'username': 'testuser'})
+        self.assertContains(follower_client.get(url), 'Отписаться')
+        other = User.objects.create_user(username='other')
+        other_client = Client()
+        other_client.force_login(other)
+        response = other_client.get(url)
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, 'follower')
+
+    def test_comment_invalidates_cached_post_page(self):
+        """Новый комментарий сбрасывает кеш страницы записи"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.authorized_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'}
+        )
+        self.assertContains(self.authorized_client.get(url), 'Свежий')
+
 
 class FollowServiceTest(TestCase):
     @classmethod
@@ -389,6 +519,18 @@ class FollowServiceTest(TestCase):
         self.authorized_client.get(url_follow)
         self.assertEqual(Follow.objects.count(), 1)
 
+    def test_repeated_follow_creates_single_subscription(self):
+        """Повторная подписка не создаёт дубликат, его запрещает БД"""
+        url_follow = reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user2}
+        )
+        self.authorized_client.get(url_follow)
+        self.authorized_client.get(url_follow)
+        self.assertEqual(Follow.objects.count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user2)
+
     def test_auth_user_can_unfollow_author(self):
         """
         Проверка возможности отписки авторизованного пользователя
@@ -463,3 +605,604 @@ class FollowServiceTest(TestCase):
         )
         self.authorized_client.get(url_follow)
         self.assertEqual(Follow.objects.count(), 0)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def feed_texts(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_filled_backfilled_and_trimmed(self):
+        """Лента пополняется при публикации и подписке, чистится отпиской"""
+        Post.objects.create(author=self.author, text='До подписки')
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        Post.objects.create(author=self.author, text='После подписки')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(
+            self.feed_texts(), ['После подписки', 'До подписки']
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=1)
+    def test_celebrity_posts_are_pulled(self):
+        """Записи популярного автора не раскладываются, но видны в ленте"""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Популярная запись')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), ['Популярная запись'])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=3, TIMELINE_HYSTERESIS=0.5)
+    def test_posts_are_fanned_out_when_author_leaves_pull_mode(self):
+        """Подтянутые записи остаются в ленте после смены режима автора"""
+        others = [
+            User.objects.create_user(username=f'other{i}') for i in range(2)
+        ]
+        for user in (self.user, *others):
+            Follow.objects.create(user=user, author=self.author)
+        Post.objects.create(author=self.author, text='Подтянутая запись')
+        self.assertFalse(TimelineEntry.objects.exists())
+        # ниже порога, но выше доли TIMELINE_HYSTERESIS: режим не меняется
+        Follow.objects.get(user=others[0]).delete()
+        self.assertTrue(
+            UserStats.objects.get(user=self.author).timeline_pulled
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.get(user=others[1]).delete()
+        # флаг меняется сразу, а ленты пополняет фоновая задача
+        self.assertFalse(
+            UserStats.objects.get(user=self.author).timeline_pulled
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        timeline.sync_author(self.author.pk)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user).exists()
+        )
+        self.assertEqual(self.feed_texts(), ['Подтянутая запись'])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_entries_of_pulled_author_are_removed(self):
+        """Строки ленты автора, ставшего подтягиваемым, удаляются"""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Разложенная запись')
+        self.assertTrue(TimelineEntry.objects.exists())
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        self.assertTrue(
+            UserStats.objects.get(user=self.author).timeline_pulled
+        )
+        # до фоновой задачи запись не повторяется в ленте
+        self.assertEqual(self.feed_texts(), ['Разложенная запись'])
+        timeline.sync_author(self.author.pk)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_texts(), ['Разложенная запись'])
+
+    @override_settings(
+        TIMELINE_CELEBRITY_FOLLOWERS=2,
+        CURSOR_PAGINATION_VIEWS=['posts:follow_index'],
+    )
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Записи разложенных и подтянутых авторов идут по дате"""
+        celebrity = User.objects.create_user(username='celebrity')
+        for user in (self.user, self.author):
+            Follow.objects.create(user=user, author=celebrity)
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(
+                author=(self.author, celebrity)[i % 3 == 0], text=f'Запись {i}'
+            )
+            for i in range(25)
+        ]
+        expected = [post.text for post in reversed(posts)]
+        feed = timeline.feed(self.user)
+        self.assertEqual(feed.count(), len(posts))
+        self.assertEqual([post.text for post in feed[5:15]], expected[5:15])
+        self.assertEqual(
+            [post.text for post in feed.reverse()[:3]],
+            [post.text for post in posts[:3]]
+        )
+        texts, cursor = [], ''
+        while True:
+            response = self.authorized_client.get(
+                reverse('posts:follow_index') + f'?cursor={cursor}'
+            )
+            page_obj = response.context['page_obj']
+            texts.extend(post.text for post in page_obj)
+            if not page_obj.has_next():
+                break
+            cursor = page_obj.next_cursor
+        self.assertEqual(texts, expected)
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Отдельная запись',
+            group=cls.group,
+        )
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def add_comments(self, count):
+        for _ in range(count):
+            commenter = User.objects.create_user(
+                username=f'commenter{Comment.objects.count()}'
+            )
+            Comment.objects.create(
+                post=self.post, author=commenter, text='Комментарий'
+            )
+
+    def test_post_detail_query_count_does_not_grow(self):
+        """Число запросов post_detail не зависит от числа комментариев"""
+        self.authorized_client.get(self.url)
+        for comments in (1, 10):
+            self.add_comments(comments)
+            cache.clear()
+            with self.subTest(comments=Comment.objects.count()):
+                # поколения кеша, сессия, пользователь, запись с автором,
+                # статистикой и группой, комментарии с авторами
+                with self.assertNumQueries(5):
+                    response = self.authorized_client.get(self.url)
+                self.assertEqual(
+                    len(response.context['comments']),
+                    min(
+                        Comment.objects.count(),
+                        int(settings.COMMENTS_PER_PAGE)
+                    )
+                )
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comments_are_paginated_with_fragment(self):
+        """Страница записи отдаёт первую порцию, фрагмент — следующую"""
+        self.add_comments(3)
+        response = self.authorized_client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 2)
+        self.assertTrue(comments.has_next())
+        fragment = self.authorized_client.get(
+            reverse('posts:comment_list', kwargs={'post_id': self.post.id}),
+            {'cursor': comments.next_cursor}
+        )
+        self.assertTemplateUsed(fragment, 'includes/comment_list.html')
+        self.assertEqual(
+            list(fragment.context['comments']),
+            list(Comment.objects.order_by('created', 'id'))[2:]
+        )
+        self.assertFalse(fragment.context['comments'].has_next())
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Запись {i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        card_stats.reset()
+
+    def render_index(self):
+        # новое поколение ленты: страница рисуется заново, карточки — нет
+        bump(ALL)
+        return self.guest_client.get(reverse('posts:index'))
+
+    def test_cards_are_reused_between_renders(self):
+        """Карточки берутся из кеша, пока запись не изменилась"""
+        self.render_index()
+        self.assertEqual(card_stats.snapshot()['misses'], 3)
+        response = self.render_index()
+        self.assertContains(response, 'Запись 2')
+        snapshot = card_stats.snapshot()
+        self.assertEqual(snapshot['hits'], 3)
+        self.assertEqual(snapshot['hit_ratio'], 0.5)
+
+    def test_edited_post_card_is_rendered_again(self):
+        """После правки записи её карточка рисуется заново"""
+        self.render_index()
+        post = self.posts[0]
+        post.text = 'Исправленная запись'
+        post.save()
+        response = self.render_index()
+        self.assertContains(response, 'Исправленная запись')
+        self.assertEqual(card_stats.snapshot()['misses'], 4)
+
+    def test_renamed_author_cards_are_rendered_again(self):
+        """Имя автора входит в ключ карточки"""
+        self.render_index()
+        self.user.first_name = 'Переименованный'
+        self.user.save()
+        response = self.render_index()
+        self.assertContains(response, 'Переименованный', count=3)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='pushkin', first_name='Александр'
+        )
+        cls.group = Group.objects.create(
+            title='Стихи', slug='poems', description='Тестовое описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, page=None):
+        params = {'q': query}
+        if page is not None:
+            params['page'] = page
+        response = Client().get(reverse('posts:search'), params)
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_by_text_group_and_author(self):
+        """Поиск находит записи по тексту, группе и автору"""
+        Post.objects.create(author=self.author, text='Мороз и солнце')
+        Post.objects.create(
+            author=self.author, text='День чудесный', group=self.group
+        )
+        self.assertEqual(self.found('солнце'), ['Мороз и солнце'])
+        self.assertEqual(self.found('мороз солн'), ['Мороз и солнце'])
+        self.assertEqual(self.found('стихи'), ['День чудесный'])
+        self.assertEqual(len(self.found('Александр')), 2)
+        self.assertEqual(self.found('"солнце*'), ['Мороз и солнце'])
+        self.assertEqual(self.found(''), [])
+
+    def test_text_match_ranks_higher(self):
+        """Совпадение в тексте важнее совпадения в имени автора"""
+        Post.objects.create(author=self.author, text='Новая запись')
+        Post.objects.create(author=self.author, text='Пушкин в Михайловском')
+        Post.objects.create(author=self.author, text='Ещё одна запись')
+        self.assertEqual(self.found('пушкин')[0], 'Пушкин в Михайловском')
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке группы и удалении записи"""
+        post = Post.objects.create(
+            author=self.author, text='Зимнее утро', group=self.group
+        )
+        self.group.title = 'Лирика'
+        self.group.save()
+        self.assertEqual(self.found('лирика'), ['Зимнее утро'])
+        self.assertEqual(self.found('стихи'), [])
+        post.delete()
+        self.assertEqual(self.found('зимнее'), [])
+
+    def test_results_are_paginated(self):
+        """Результаты делятся на страницы, ссылки сохраняют запрос"""
+        for number in range(settings.COUNT_INDEX_POSTS + 1):
+            Post.objects.create(author=self.author, text=f'Сонет {number}')
+        self.assertEqual(
+            len(self.found('сонет')), settings.COUNT_INDEX_POSTS
+        )
+        self.assertEqual(len(self.found('сонет', page=2)), 1)
+        response = Client().get(reverse('posts:search'), {'q': 'сонет'})
+        self.assertContains(
+            response, f'?{urlencode({"q": "сонет"})}&amp;page=2'
+        )
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='Тестовая запись', group=self.group
+        )
+        self.guest_client = Client()
+
+    def revalidate(self, url, response):
+        return self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        ).status_code
+
+    def test_anonymous_pages_answer_304(self):
+        """Неизменившаяся страница отдаётся анониму ответом 304"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'testuser'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIn('public', response['Cache-Control'])
+                # одно агрегирующее обращение к базе
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.revalidate(url, response), 304)
+
+    def test_changes_invalidate_validators(self):
+        """Новый комментарий и правка группы меняют ETag"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        group = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+        detail_response = self.guest_client.get(detail)
+        group_response = self.guest_client.get(group)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertEqual(self.revalidate(detail, detail_response), 200)
+        self.assertEqual(self.revalidate(group, group_response), 200)
+
+    def test_edit_changes_feed_etag(self):
+        """Правка записи меняет ETag ленты, хотя новее она не стала"""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        self.post.text = 'Исправленная запись'
+        self.post.save()
+        self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_authorized_pages_are_private(self):
+        """Страницы авторизованного не получают валидаторов"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+
+class PageChromeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cached_page_is_shared_and_filled_per_user(self):
+        """Тело страницы кешируется одно, шапка — своя у каждого"""
+        url = reverse('posts:index')
+        response = self.author_client.get(url)
+        self.assertIn('page_obj', response.context)
+        self.assertContains(response, 'Пользователь: author')
+        response = self.reader_client.get(url)
+        # представление не вызывалось — страница взята из кеша
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Пользователь: author')
+        self.assertContains(response, 'Избранные авторы')
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertNotContains(response, 'Избранные авторы')
+        self.assertNotContains(response, '<!--chrome:')
+
+    def test_not_found_page_has_filled_chrome(self):
+        """Страница 404 кешируемого представления получает шапку"""
+        url = reverse('posts:profile', kwargs={'username': 'missing'})
+        response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertContains(
+            response, 'Пользователь: reader', status_code=404
+        )
+        self.assertNotContains(response, '<!--chrome:', status_code=404)
+
+    def test_follow_button_follows_current_user(self):
+        """Кнопка подписки в профиле зависит от посетителя"""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertContains(self.reader_client.get(url), 'Отписаться')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Отписаться')
+
+    def test_post_buttons_and_comment_form(self):
+        """Кнопка правки — только автору, форма комментария — авторизованным"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        edit_url = reverse('posts:post_edit', kwargs={'post_id': self.post.pk})
+        comment_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.pk}
+        )
+        response = self.author_client.get(url)
+        self.assertContains(response, edit_url)
+        self.assertContains(response, comment_url)
+        response = self.reader_client.get(url)
+        self.assertNotContains(response, edit_url)
+        self.assertContains(response, comment_url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, edit_url)
+        self.assertNotContains(response, comment_url)
+
+
+@override_settings(PAGINATOR_ON_EACH_SIDE=2)
+class CountedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Запись {i}') for i in range(95)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, queries):
+        return [q for q in queries if 'COUNT(' in q['sql']]
+
+    def test_count_is_cached_until_feed_changes(self):
+        """COUNT(*) ленты выполняется один раз до изменения ленты"""
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                paginator = CountedPaginator(Post.objects.all(), 10, ALL)
+                result = paginator.count
+            return result, len(self.count_queries(queries))
+
+        self.assertEqual(count(), (95, 1))
+        self.assertEqual(count(), (95, 0))
+        Post.objects.create(author=self.user, text='Новая запись')
+        self.assertEqual(count(), (96, 1))
+
+    def test_page_window(self):
+        """Номера страниц — первая, последняя и соседи текущей"""
+        paginator = CountedPaginator(Post.objects.all(), 10)
+        ellipsis = CountedPaginator.ELLIPSIS
+        cases = {
+            1: [1, 2, 3, ellipsis, 10],
+            5: [1, 2, 3, 4, 5, 6, 7, ellipsis, 10],
+            6: [1, ellipsis, 4, 5, 6, 7, 8, 9, 10],
+            10: [1, ellipsis, 8, 9, 10],
+        }
+        for number, window in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    paginator.get_page(number).page_window, window
+                )
+
+    def test_paginator_renders_window(self):
+        """Пагинатор ленты не выводит ссылки на все страницы"""
+        response = self.client.get(reverse('posts:index') + '?page=5')
+        self.assertContains(response, '?page=7"')
+        self.assertContains(response, '?page=10"')
+        self.assertNotContains(response, '?page=8"')
+
+
+class QueryMetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_slug', description='Описание'
+        )
+        for i in range(12):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Запись {i}'
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_and_log(self):
+        """Ответ содержит Server-Timing, в лог пишется JSON-строка"""
+        with self.assertLogs('yatube.metrics', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['queries'], 0)
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{record["queries"]} queries', timing)
+        self.assertIn('tpl;dur=', timing)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_can_be_disabled(self):
+        """Без SERVER_TIMING замеры не попадают в заголовки ответа"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_repeated_queries_are_counted(self):
+        """Одинаковый SQL с разными параметрами считается повтором"""
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            for post in Post.objects.all()[:3]:
+                User.objects.get(pk=post.author_id)
+        self.assertEqual(metrics.queries, 4)
+        self.assertEqual(metrics.duplicates(), 2)
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_MODE='raise'
+    )
+    def test_background_queries_are_counted_outside_budget(self):
+        """Запросы фоновых задач есть в замерах, но не в бюджете"""
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            with background_queries():
+                list(Post.objects.all()[:1])
+        self.assertEqual(metrics.queries, 1)
+        self.assertEqual(metrics.background_queries, 1)
+        self.assertGreater(metrics.sql_time, 0)
+        QueryMetricsMiddleware(None).check_budget('posts:index', metrics)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_views_fit_budgets(self):
+        """Основные страницы укладываются в QUERY_BUDGETS"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=запись',
+        )
+        for client in (self.client, self.reader_client):
+            for url in urls:
+                with self.subTest(url=url):
+                    # гостя лента подписок отправляет на вход
+                    self.assertIn(client.get(url).status_code, (200, 302))
+
+    def test_exceeded_budget(self):
+        """Превышение бюджета пишется в лог или поднимает исключение"""
+        url = reverse('posts:index')
+        with override_settings(QUERY_BUDGETS={'posts:index': 0}):
+            with override_settings(QUERY_BUDGET_MODE='log'):
+                with self.assertLogs('yatube.metrics', 'WARNING'):
+                    self.client.get(url)
+            with override_settings(QUERY_BUDGET_MODE='raise'):
+                with self.assertRaises(QueryBudgetExceeded):
+                    self.client.get(url)
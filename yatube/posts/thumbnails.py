@@ -0,0 +1,197 @@
+"""
+Фоновая подготовка миниатюр.
+
+Стандартный бэкенд sorl-thumbnail при первом обращении к миниатюре
+декодирует и уменьшает картинку прямо в запросе. AsyncThumbnailBackend
+отдаёт готовую миниатюру, если она уже есть, а иначе ставит её в очередь
+пула потоков и сразу возвращает исходную картинку. Размеры из
+THUMBNAIL_SIZES готовятся заранее — после сохранения записи с картинкой.
+Записи kvstore о миниатюрах страницы ленты читаются в кеш одним
+запросом (prefetch), а не по запросу на карточку. Тот же пул выполняет
+и другие фоновые задачи (posts.images, posts.timeline).
+"""
+import logging
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.metrics import THUMBNAIL_DURATION
+from core.middleware import background_queries
+
+from .fragments import mark_placeholder
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+_futures = set()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def run(key, func, *args):
+    started = time.perf_counter()
+    try:
+        # при THUMBNAIL_WORKERS=0 задача идёт в потоке ответа,
+        # но к бюджету запросов представления не относится
+        with background_queries():
+            func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s не удалась', key)
+    finally:
+        # неудачные задачи тоже занимают пул, их время учитывается
+        THUMBNAIL_DURATION.observe(
+            time.perf_counter() - started, job=func.__name__
+        )
+
+
+def run_in_worker(key, func, *args):
+    """run в потоке пула."""
+    try:
+        run(key, func, *args)
+    finally:
+        with _lock:
+            _pending.discard(key)
+        # у потока пула свои соединения с базами (kvstore sorl, реплики);
+        # request_finished их не закрывает, а CONN_MAX_AGE держал бы
+        # открытыми, пока жив поток
+        connections.close_all()
+
+
+def submit(key, func, *args):
+    """
+    Ставит задачу в пул, если задача с тем же ключом ещё не в очереди;
+    при THUMBNAIL_WORKERS=0 выполняет её сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        run(key, func, *args)
+        return
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    future = get_executor().submit(run_in_worker, key, func, *args)
+    with _lock:
+        _futures.add(future)
+    future.add_done_callback(_futures.discard)
+
+
+def wait(timeout=None):
+    """Ждёт завершения задач, поставленных в пул до вызова."""
+    with _lock:
+        pending = set(_futures)
+    futures.wait(pending, timeout=timeout)
+
+
+def generate(source, geometry, options):
+    default.backend.generate(source, geometry, **options)
+
+
+def schedule(source, geometry, options):
+    """
+    Ставит миниатюру в очередь на подготовку. source — ImageFile с тем же
+    хранилищем, что у поля: оно входит в ключ kvstore.
+    """
+    key = serialize([source.key, geometry, options])
+    submit(key, generate, source, geometry, options)
+
+
+def pregenerate(image):
+    """Готовит все размеры из THUMBNAIL_SIZES для картинки записи."""
+    if not image:
+        return
+    for geometry, options in settings.THUMBNAIL_SIZES:
+        schedule(ImageFile(image), geometry, dict(options))
+
+
+def prefetch(images):
+    """
+    Читает записи kvstore миниатюр THUMBNAIL_SIZES для картинок images,
+    которых ещё нет в кеше, одним запросом и кладёт их в кеш.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return
+    keys = [
+        add_prefix(default.backend.thumbnail_file(
+            image, geometry, dict(options)
+        ).key)
+        for image in images if image
+        for geometry, options in settings.THUMBNAIL_SIZES
+    ]
+    if not keys:
+        return
+    missing = set(keys).difference(kvstore.cache.get_many(keys))
+    if not missing:
+        return
+    values = dict(KVStoreModel.objects.filter(
+        key__in=missing
+    ).values_list('key', 'value'))
+    # отсутствие записи тоже кешируется, как в самом kvstore
+    kvstore.cache.set_many(
+        {key: values.get(key, EMPTY_VALUE) for key in missing},
+        thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+    )
+
+
+class AsyncThumbnailBackend(ThumbnailBackend):
+    def thumbnail_file(self, file_, geometry_string, options):
+        """ImageFile миниатюры с опциями по умолчанию; файла может не быть."""
+        source = ImageFile(file_)
+        # те же опции по умолчанию, что в ThumbnailBackend.get_thumbnail,
+        # иначе имя миниатюры не совпадёт
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, options):
+        """Готовая миниатюра из kvstore или None, без обработки картинки."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, options)
+        )
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        requested = dict(options)
+        cached = self.get_cached_thumbnail(file_, geometry_string, options)
+        if cached:
+            return cached
+        schedule(ImageFile(file_), geometry_string, requested)
+        mark_placeholder()
+        return ImageFile(file_)
+
+    def generate(self, file_, geometry_string, **options):
+        """Синхронная подготовка миниатюры — для пула и команд."""
+        return super().get_thumbnail(file_, geometry_string, **options)
@@ -0,0 +1,315 @@
+"""
+Лента подписок с раскладкой при записи (fan-out-on-write).
+
+Новая запись автора сразу копируется в ленты его подписчиков, поэтому
+follow_index читает готовый список по индексу ленты, а не соединяет
+posts_post с posts_follow. Для «тяжёлых» авторов — с большим числом
+подписчиков или записей — раскладка не выполняется: их записи
+подтягиваются в ленту при чтении.
+
+Режим автора хранится в UserStats.timeline_pulled и меняется при
+изменении его счётчиков. Обратно к раскладке автор переходит, только
+опустившись ниже доли TIMELINE_HYSTERESIS порогов, чтобы режим не
+переключался на каждой подписке и отписке. Флаг меняется сразу, а
+строки ленты автора раскладываются или удаляются фоновой задачей
+(sync_author в пуле posts.thumbnails) после фиксации транзакции: пока
+она не выполнилась, старые записи вернувшегося к раскладке автора в
+ленте не видны. Если задача потерялась, ленты восстанавливает
+rebuild_timelines.
+
+Строка ленты хранит копию даты публикации, поэтому страница ленты
+(Feed) читается по индексу (user, -pub_date, -post) и по индексу
+записей каждого подтянутого автора, без сортировки всей ленты.
+"""
+import copy
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+from . import thumbnails
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 500
+# подтянутые авторы сверх этого числа читаются в ленту одной ветвью UNION
+PULLED_BRANCHES = 100
+
+
+def pull_condition(ratio=1):
+    return (
+        Q(followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS * ratio)
+        | Q(posts_count__gt=settings.TIMELINE_BACKFILL_POSTS * ratio)
+    )
+
+
+def wants_pull(stats):
+    ratio = settings.TIMELINE_HYSTERESIS if stats.timeline_pulled else 1
+    return (
+        stats.followers_count >= settings.TIMELINE_CELEBRITY_FOLLOWERS * ratio
+        or stats.posts_count > settings.TIMELINE_BACKFILL_POSTS * ratio
+    )
+
+
+def update_mode(author_id):
+    """
+    Переключает режим автора по его счётчикам; возвращает True, если
+    записи автора подтягиваются при чтении.
+    """
+    stats = UserStats.objects.filter(user_id=author_id).first()
+    if stats is None:
+        return False
+    pulled = wants_pull(stats)
+    if pulled != stats.timeline_pulled:
+        switched = UserStats.objects.filter(
+            user_id=author_id, timeline_pulled=stats.timeline_pulled
+        ).update(timeline_pulled=pulled)
+        if switched:
+            transaction.on_commit(lambda: thumbnails.submit(
+                ('timeline', author_id), sync_author, author_id
+            ))
+    return pulled
+
+
+def sync_author(author_id):
+    """
+    Приводит строки лент с записями автора к его режиму: раскладывает
+    их или удаляет, если записи подтягиваются при чтении.
+    """
+    if UserStats.objects.filter(
+        user_id=author_id, timeline_pulled=True
+    ).exists():
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+    else:
+        fill(Follow.objects.filter(author_id=author_id))
+
+
+def update_modes(user_ids=None):
+    """То же для пользователей user_ids (всех, если None) пачками."""
+    if user_ids is None:
+        user_ids = UserStats.objects.values_list('user_id', flat=True)
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        stats = UserStats.objects.filter(
+            user_id__in=user_ids[start:start + BATCH_SIZE]
+        )
+        pulled = list(stats.filter(timeline_pulled=False).filter(
+            pull_condition()
+        ).values_list('user_id', flat=True))
+        if pulled:
+            UserStats.objects.filter(user_id__in=pulled).update(
+                timeline_pulled=True
+            )
+            TimelineEntry.objects.filter(
+                post__author_id__in=pulled
+            ).delete()
+        pushed = list(stats.filter(timeline_pulled=True).exclude(
+            pull_condition(settings.TIMELINE_HYSTERESIS)
+        ).values_list('user_id', flat=True))
+        if pushed:
+            UserStats.objects.filter(user_id__in=pushed).update(
+                timeline_pulled=False
+            )
+            fill(Follow.objects.filter(author_id__in=pushed))
+
+
+def pulled_authors(user):
+    return Follow.objects.filter(
+        user=user, author__stats__timeline_pulled=True
+    ).values('author_id')
+
+
+def fill(follows, posts=None):
+    """
+    Раскладывает записи авторов подписок follows (только posts, если
+    заданы) по лентам подписчиков одним INSERT … SELECT. Авторы, чьи
+    записи подтягиваются при чтении, пропускаются, уже разложенные
+    записи не дублируются.
+    """
+    follows = follows.exclude(author__stats__timeline_pulled=True)
+    follows_sql, follows_params = follows.order_by().values(
+        'user_id', 'author_id'
+    ).query.sql_with_params()
+    posts_sql, posts_params = (
+        Post.objects.all() if posts is None else posts
+    ).order_by().values(
+        'id', 'author_id', 'pub_date'
+    ).query.sql_with_params()
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date FROM ({follows_sql}) f '
+            f'JOIN ({posts_sql}) p ON p.author_id = f.author_id '
+            # WHERE нужен SQLite, чтобы разобрать ON CONFLICT после SELECT
+            'WHERE 1 = 1 ON CONFLICT DO NOTHING',
+            (*follows_params, *posts_params)
+        )
+
+
+def fan_out(post):
+    """Раскладывает новую запись по лентам подписчиков автора."""
+    if update_mode(post.author_id):
+        return
+    fill(
+        Follow.objects.filter(author_id=post.author_id),
+        Post.objects.filter(pk=post.pk)
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя записи автора, на которого он подписался."""
+    if update_mode(author_id):
+        return
+    fill(Follow.objects.filter(user_id=user_id, author_id=author_id))
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты читателя записи автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    update_mode(author_id)
+
+
+def entry_condition(condition):
+    """Условие по полям записи для строк ленты: id записи там — post_id."""
+    clone = copy.copy(condition)
+    clone.children = [
+        entry_condition(child) if isinstance(child, Q)
+        else (re.sub(r'^id(?=__|$)', 'post_id', child[0]), child[1])
+        for child in condition.children
+    ]
+    return clone
+
+
+class Feed:
+    """
+    Записи ленты подписок читателя для пагинаторов posts.utils.
+
+    Срез [start:stop] читает id первых stop записей одним запросом:
+    строки ленты по индексу (user, -pub_date, -post) и записи каждого
+    подтянутого автора по индексу (author, -pub_date, -id), по stop
+    из каждой ветви UNION, — сортируются только они. Вторым запросом
+    выбираются сами записи. Из методов QuerySet есть те, что нужны
+    пагинаторам: count (без учёта filter), order_by по -pub_date, -id
+    или pub_date, id, filter по этим полям, reverse и select_related.
+    """
+
+    ordered = True
+
+    def __init__(self, user):
+        self.user = user
+        self.conditions = []
+        self.descending = True
+        self.related = ()
+
+    def clone(self, **attrs):
+        clone = copy.copy(self)
+        clone.__dict__.update(attrs)
+        return clone
+
+    @cached_property
+    def pulled_counts(self):
+        """Число записей каждого подтянутого автора подписок."""
+        return dict(UserStats.objects.filter(
+            user_id__in=pulled_authors(self.user)
+        ).order_by('user_id').values_list('user_id', 'posts_count'))
+
+    @property
+    def pulled(self):
+        return list(self.pulled_counts)
+
+    def select_related(self, *fields):
+        return self.clone(related=fields)
+
+    def order_by(self, *ordering):
+        if ordering not in (('-pub_date', '-id'), ('pub_date', 'id')):
+            raise ValueError(f'Ленту нельзя упорядочить по {ordering}.')
+        return self.clone(descending=ordering[0].startswith('-'))
+
+    def reverse(self):
+        return self.clone(descending=not self.descending)
+
+    def filter(self, *conditions):
+        return self.clone(conditions=[*self.conditions, *conditions])
+
+    def count(self):
+        return TimelineEntry.objects.filter(
+            user=self.user
+        ).count() + sum(self.pulled_counts.values())
+
+    def branches(self, limit):
+        order = '-' if self.descending else ''
+        yield TimelineEntry.objects.filter(
+            *map(entry_condition, self.conditions), user=self.user
+        ).order_by(f'{order}pub_date', f'{order}post_id').values(
+            'pub_date', 'post_id'
+        )[:limit]
+        groups = [[author_id] for author_id in self.pulled[:PULLED_BRANCHES]]
+        if self.pulled[PULLED_BRANCHES:]:
+            groups.append(self.pulled[PULLED_BRANCHES:])
+        for authors in groups:
+            yield Post.objects.filter(
+                *self.conditions, author_id__in=authors
+            ).order_by(f'{order}pub_date', f'{order}id').values(
+                'pub_date', post_id=F('id')
+            )[:limit]
+
+    def ids(self, limit):
+        """id первых limit записей ленты по порядку."""
+        if limit <= 0:
+            return []
+        using = router.db_for_read(TimelineEntry)
+        parts, params = [], []
+        for branch in self.branches(limit):
+            sql, branch_params = branch.query.get_compiler(using).as_sql()
+            parts.append(f'SELECT * FROM ({sql}) b{len(parts)}')
+            params.extend(branch_params)
+        direction = 'DESC' if self.descending else 'ASC'
+        with connections[using].cursor() as cursor:
+            # UNION, а не UNION ALL: пока sync_author не удалил строки
+            # ленты ставшего подтягиваемым автора, записи повторяются
+            cursor.execute(
+                f'SELECT post_id FROM ({" UNION ".join(parts)}) feed '
+                f'ORDER BY pub_date {direction}, post_id {direction} '
+                'LIMIT %s',
+                (*params, limit)
+            )
+            return [post_id for post_id, in cursor.fetchall()]
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            posts = self[index:index + 1]
+            if not posts:
+                raise IndexError('В ленте нет записи с таким номером.')
+            return posts[0]
+        if index.stop is None or index.step:
+            raise TypeError('Ленту можно только срезать до конечной границы.')
+        ids = self.ids(index.stop)[index.start:]
+        posts = Post.objects.select_related(*self.related).in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+    def queryset(self):
+        """Все записи ленты одним запросом — для агрегатов."""
+        return Post.objects.filter(
+            Q(pk__in=TimelineEntry.objects.filter(
+                user=self.user
+            ).values('post_id'))
+            | Q(author_id__in=pulled_authors(self.user))
+        )
+
+
+def feed(user):
+    """Лента подписок: разложенные записи плюс подтянутые при чтении."""
+    return Feed(user)
+
+
+@transaction.atomic
+def rebuild():
+    """Заново раскладывает ленты по текущим подпискам."""
+    TimelineEntry.objects.all().delete()
+    UserStats.objects.update(timeline_pulled=False)
+    UserStats.objects.filter(pull_condition()).update(timeline_pulled=True)
+    fill(Follow.objects.all())
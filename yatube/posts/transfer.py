@@ -0,0 +1,297 @@
+"""
+Выгрузка и загрузка данных постов в NDJSON.
+
+Каждая строка — объект {"model": ..., "pk": ..., "fields": {...}};
+внешние ключи записаны старыми id (author_id, group_id, ...). Модели
+идут в порядке зависимостей, а объекты каждой — по возрастанию id,
+поэтому загрузка читает файл одним проходом.
+
+Новый id объекта — старый плюс сдвиг его модели, который выбирается
+по первому объекту так, чтобы новые id шли после текущего максимума.
+Поэтому bulk_create не нужно возвращать id из базы, а в памяти
+соответствие хранится только для пользователей и групп, уже
+существующих под тем же username или slug: они не создаются заново,
+а подставляются. Ссылки на пропущенные в файле id ловит проверка
+внешних ключей перед концом транзакции.
+
+bulk_create не отправляет сигналов, поэтому после загрузки производные
+данные (статистика, ленты подписок, поисковый индекс, ссылки
+на картинки) строятся только для вставленных объектов — с id
+не меньше первого нового. Сами файлы картинок не выгружаются —
+каталог media переносится отдельно.
+"""
+import datetime
+import json
+from contextlib import contextmanager
+from itertools import groupby
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+
+from . import cache, search, timeline
+from .models import Comment, Follow, Group, MediaBlob, Post, User, UserStats
+
+USER_FIELDS = (
+    'username', 'first_name', 'last_name', 'email', 'password',
+    'is_staff', 'is_active', 'is_superuser', 'last_login', 'date_joined',
+)
+
+
+class Spec:
+    """Как выгружать и загружать одну модель."""
+
+    def __init__(self, name, model, fields, foreign_keys=None,
+                 natural_key=None):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        # поле с id → имя модели, на которую оно ссылается
+        self.foreign_keys = foreign_keys or {}
+        # уникальное поле, по которому находятся существующие объекты
+        self.natural_key = natural_key
+
+
+SPECS = [
+    Spec('user', User, USER_FIELDS, natural_key='username'),
+    Spec('group', Group, ('title', 'slug', 'description'), natural_key='slug'),
+    Spec('post', Post, (
+        'text', 'pub_date', 'updated', 'author_id', 'group_id', 'image',
+    ), {'author_id': 'user', 'group_id': 'group'}),
+    Spec('comment', Comment, ('post_id', 'author_id', 'text', 'created'), {
+        'post_id': 'post', 'author_id': 'user',
+    }),
+    Spec('follow', Follow, ('user_id', 'author_id'), {
+        'user_id': 'user', 'author_id': 'user',
+    }),
+]
+SPECS_BY_NAME = {spec.name: spec for spec in SPECS}
+
+
+class TransferError(Exception):
+    pass
+
+
+class Encoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder обрезает время до миллисекунд, здесь — полное."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export(stream, chunk_size=2000):
+    """Пишет все объекты в stream; возвращает {модель: количество}."""
+    totals = {}
+    for spec in SPECS:
+        rows = spec.model.objects.order_by('pk').values('pk', *spec.fields)
+        total = 0
+        for row in rows.iterator(chunk_size=chunk_size):
+            pk = row.pop('pk')
+            stream.write(json.dumps(
+                {'model': spec.name, 'pk': pk, 'fields': row},
+                cls=Encoder, ensure_ascii=False,
+            ))
+            stream.write('\n')
+            total += 1
+        totals[spec.name] = total
+    return totals
+
+
+@contextmanager
+def keep_timestamps(model):
+    """Не даёт auto_now и auto_now_add затереть загружаемые даты."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def read_records(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            spec = SPECS_BY_NAME[record['model']]
+            yield number, spec, record['pk'], record['fields']
+        except (ValueError, KeyError, TypeError):
+            raise TransferError(f'Строка {number}: неверная запись.')
+
+
+class Importer:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        # имя модели → сдвиг новых id относительно старых
+        self.offsets = {}
+        # имя модели → {старый id: id существующего объекта}
+        self.reused = {spec.name: {} for spec in SPECS}
+        self.first_ids = {}
+        self.last_ids = {}
+        self.created = {spec.name: 0 for spec in SPECS}
+        self.scopes = {cache.ALL}
+
+    def check_order(self, number, spec, old_id):
+        last = self.last_ids.get(spec.name)
+        if not isinstance(old_id, int) or last is not None and old_id <= last:
+            raise TransferError(
+                f'Строка {number}: id {spec.name} должны возрастать.'
+            )
+        self.last_ids[spec.name] = old_id
+
+    def new_id(self, spec, old_id):
+        if spec.name not in self.offsets:
+            self.offsets[spec.name] = self.first_ids[spec.name] - old_id
+        return old_id + self.offsets[spec.name]
+
+    def resolve(self, target, old_id):
+        """Новый id объекта target; None, если его не было в файле."""
+        if old_id in self.reused[target]:
+            return self.reused[target][old_id]
+        offset = self.offsets.get(target)
+        if (
+            offset is None or not isinstance(old_id, int)
+            or old_id + offset < self.first_ids[target]
+            or old_id > self.last_ids[target]
+        ):
+            return None
+        return old_id + offset
+
+    def remap(self, number, spec, fields):
+        for field, target in spec.foreign_keys.items():
+            old_id = fields.get(field)
+            if old_id is None:
+                continue
+            fields[field] = self.resolve(target, old_id)
+            if fields[field] is None:
+                raise TransferError(
+                    f'Строка {number}: {field}={old_id} ссылается '
+                    f'на отсутствующий объект {target}.'
+                )
+        return fields
+
+    def existing(self, spec, records):
+        """id уже существующих объектов по естественному ключу."""
+        if spec.natural_key is None:
+            return {}
+        keys = [fields.get(spec.natural_key) for _, _, fields in records]
+        return dict(spec.model.objects.filter(
+            **{f'{spec.natural_key}__in': keys}
+        ).values_list(spec.natural_key, 'pk'))
+
+    def load_batch(self, spec, records):
+        existing = self.existing(spec, records)
+        objects = []
+        for number, old_id, fields in records:
+            self.check_order(number, spec, old_id)
+            fields = self.remap(number, spec, fields)
+            if spec.natural_key is not None:
+                key = fields.get(spec.natural_key)
+                if key in existing:
+                    self.reused[spec.name][old_id] = existing[key]
+                    continue
+            if spec.model is Follow and (
+                fields['user_id'] == fields['author_id']
+            ):
+                continue
+            objects.append(spec.model(pk=self.new_id(spec, old_id), **fields))
+            if spec.model is Post:
+                self.scopes.add(cache.author_scope(fields['author_id']))
+                self.scopes.add(cache.group_scope(fields.get('group_id')))
+        try:
+            with keep_timestamps(spec.model), transaction.atomic():
+                spec.model.objects.bulk_create(
+                    objects, ignore_conflicts=spec.model is Follow
+                )
+        except IntegrityError as error:
+            raise TransferError(
+                f'Строка {records[0][0]} и далее: {error}.'
+            )
+        self.created[spec.name] += len(objects)
+
+    def load(self, stream):
+        with transaction.atomic():
+            self.first_ids = {
+                spec.name: next_free_id(spec.model) for spec in SPECS
+            }
+            records = read_records(stream)
+            for spec, group in groupby(records, key=lambda record: record[1]):
+                batch = []
+                for number, _, old_id, fields in group:
+                    batch.append((number, old_id, fields))
+                    if len(batch) >= self.batch_size:
+                        self.load_batch(spec, batch)
+                        batch = []
+                if batch:
+                    self.load_batch(spec, batch)
+            models = [spec.model for spec in SPECS]
+            check_references(models)
+            reset_sequences(models)
+            rebuild_derived(self.first_ids, self.batch_size)
+        cache.bump(*self.scopes)
+        return self.created
+
+
+def next_free_id(model):
+    """Первый id после текущего максимума."""
+    last = model.objects.aggregate(last=Max('pk'))['last']
+    return (last or 0) + 1
+
+
+def reset_sequences(models):
+    """Сдвигает последовательности id после вставки явных id."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def check_references(models):
+    """Проверяет внешние ключи вставленных строк до конца транзакции."""
+    try:
+        connection.check_constraints(
+            table_names=[model._meta.db_table for model in models]
+        )
+    except IntegrityError as error:
+        raise TransferError(f'Ссылка на отсутствующий объект: {error}.')
+
+
+def rebuild_derived(first_ids, batch_size=1000):
+    """
+    Данные, которые обычно поддерживают сигналы, для объектов,
+    вставленных bulk_create: с id не меньше first_ids[имя модели].
+    """
+    posts = Post.objects.filter(pk__gte=first_ids['post'])
+    follows = Follow.objects.filter(pk__gte=first_ids['follow'])
+    user_ids = set(User.objects.filter(
+        pk__gte=first_ids['user']
+    ).values_list('pk', flat=True))
+    for queryset, field in (
+        (posts, 'author_id'),
+        (Comment.objects.filter(pk__gte=first_ids['comment']), 'author_id'),
+        (follows, 'user_id'),
+        (follows, 'author_id'),
+    ):
+        user_ids.update(
+            queryset.order_by().values_list(field, flat=True).distinct()
+        )
+    UserStats.objects.rebuild_many(user_ids, batch_size)
+    timeline.update_modes(user_ids)
+    timeline.fill(follows)
+    timeline.fill(Follow.objects.all(), posts)
+    search.update_many(
+        posts.order_by('pk').values_list('pk', flat=True).iterator(),
+        batch_size
+    )
+    MediaBlob.objects.acquire_many(posts)
@@ -0,0 +1,114 @@
+"""
+Приём картинок записей.
+
+LimitedFileUploadHandler пишет загрузку на диск по частям и перестаёт
+писать, когда она превышает IMAGE_UPLOAD_MAX_SIZE, — форма отклоняет
+такой файл по размеру, не открывая его. Остальные картинки проверяются
+по заголовку (формат и число пикселей) до полного декодирования, затем
+уменьшаются до IMAGE_UPLOAD_MAX_DIMENSION и один раз перекодируются
+без EXIF.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+OUTPUT_FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+
+
+class LimitedFileUploadHandler(TemporaryFileUploadHandler):
+    """Временный файл на диске, без содержимого сверх лимита размера."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.oversized = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.oversized:
+            return None
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            # размер дойдёт до формы через file_size, данные не нужны
+            self.oversized = True
+            self.file.seek(0)
+            self.file.truncate()
+            return None
+        self.file.write(raw_data)
+        return None
+
+
+def check_size(upload):
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': settings.IMAGE_UPLOAD_MAX_SIZE // 2 ** 20},
+        )
+
+
+def check_header(image):
+    """Проверки по заголовку, без декодирования пикселей."""
+    if image.format not in settings.IMAGE_UPLOAD_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='invalid_format',
+            params={'format': image.format},
+        )
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка %(width)d×%(height)d слишком большая.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def downsize(image):
+    max_side = settings.IMAGE_UPLOAD_MAX_DIMENSION
+    if image.format == 'JPEG':
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8)
+        image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    factor = max(image.size) // max_side
+    if factor > 1:
+        image = image.reduce(factor)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def process_image(upload):
+    """
+    Проверенная, уменьшенная и перекодированная копия загруженной
+    картинки; upload.image — результат Image.open из forms.ImageField.
+    """
+    check_header(upload.image)
+    upload.seek(0)
+    image = Image.open(upload)
+    source_format = image.format
+    image = downsize(image)
+    if source_format == 'JPEG':
+        output_format = 'JPEG'
+        image = image.convert('RGB')
+    elif source_format == 'WEBP':
+        # в PNG фотография из WebP выросла бы в разы
+        output_format = 'WEBP'
+    else:
+        output_format = 'PNG'
+    # PNG и WebP без exif= берут метаданные из image.info
+    image.info.pop('exif', None)
+    buffer = BytesIO()
+    image.save(
+        buffer, output_format,
+        quality=settings.IMAGE_UPLOAD_QUALITY, optimize=True
+    )
+    extension, content_type = OUTPUT_FORMATS[output_format]
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type)
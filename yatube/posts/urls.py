@@ -9,6 +9,8 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     # Профайл пользователя
     path('profile/<str:username>/', views.profile, name='profile'),
+    # Поиск по записям
+    path('search/', views.post_search, name='search'),
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     # Создание новой записи
@@ -21,6 +23,12 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    # Следующая порция комментариев
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comment_list,
+        name='comment_list'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
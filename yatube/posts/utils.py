@@ -1,7 +1,209 @@
-from django.core.paginator import Paginator
 from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
 
+from . import thumbnails
+from .cache import get_generations
 
-def page_list(post_list, request):
-    paginator = Paginator(post_list, settings.COUNT_INDEX_POSTS)
-    return paginator.get_page(request.GET.get('page'))
+CURSOR_SALT = 'posts.utils.cursor'
+COUNT_KEY = 'posts.count.{}.{}'
+
+
+class CountedPaginator(Paginator):
+    """
+    Пагинатор ленты, который не считает COUNT(*) на каждый запрос:
+    число записей ленты scope (область posts.cache) хранится в кеше
+    под ключом с поколением области, поэтому пересчитывается после
+    изменения ленты и не реже раза в PAGINATOR_COUNT_TIMEOUT секунд.
+    Странице добавляется page_window — номера страниц вокруг текущей
+    с первой и последней, пропуски отмечены ELLIPSIS.
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, scope=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+
+    @cached_property
+    def count(self):
+        if self.scope is None:
+            return super().count
+        generation, = get_generations([self.scope])
+        key = COUNT_KEY.format(self.scope, generation)
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def get_elided_page_range(self, number=1, on_each_side=None, on_ends=1):
+        """Как Paginator.get_elided_page_range из Django 3.2."""
+        if on_each_side is None:
+            on_each_side = settings.PAGINATOR_ON_EACH_SIDE
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.page_window = list(self.get_elided_page_range(page.number))
+        return page
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации, совместимая с paginator.html."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинация по ключу (keyset): вместо COUNT(*) и OFFSET страница
+    выбирается условием по полям сортировки последней показанной записи.
+    Поля сортировки должны иметь одно направление и однозначно задавать
+    порядок, поэтому последним идёт первичный ключ.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.descending = ordering[0].startswith('-')
+
+    @property
+    def num_pages(self):
+        return None
+
+    @property
+    def page_range(self):
+        return range(0)
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, name) for name in self.fields]
+        key = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ]
+        return signing.dumps({'k': key, 'd': direction}, salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if (
+            not isinstance(payload, dict)
+            or payload.get('d') not in ('next', 'prev')
+            or len(payload.get('k') or ()) != len(self.fields)
+        ):
+            return None
+        return payload
+
+    def keyset_filter(self, key, forward):
+        """Условие «строго после ключа» в направлении обхода."""
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            equal = {field: key[j] for j, field in enumerate(self.fields[:i])}
+            condition |= Q(**equal, **{f'{name}__{lookup}': key[i]})
+        return condition
+
+    def get_page(self, cursor):
+        payload = self.decode_cursor(cursor)
+        if payload is None:
+            return self.first_page()
+        forward = payload['d'] == 'next'
+        queryset = self.object_list.filter(
+            self.keyset_filter(payload['k'], forward)
+        )
+        if not forward:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return self.first_page()
+        if not forward:
+            rows.reverse()
+        next_cursor = previous_cursor = None
+        if has_more or not forward:
+            next_cursor = self.encode_cursor(rows[-1], 'next')
+        if has_more or forward:
+            previous_cursor = self.encode_cursor(rows[0], 'prev')
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def first_page(self):
+        rows = list(self.object_list[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1], 'next')
+        return CursorPage(rows, self, next_cursor, None)
+
+
+def use_cursor_pagination(request):
+    match = getattr(request, 'resolver_match', None)
+    return (
+        match is not None
+        and match.view_name in settings.CURSOR_PAGINATION_VIEWS
+    )
+
+
+def page_list(post_list, request, scope=None):
+    """Страница ленты; scope — область posts.cache для кеша счётчика."""
+    if use_cursor_pagination(request):
+        paginator = CursorPaginator(post_list, settings.COUNT_INDEX_POSTS)
+        page = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = CountedPaginator(
+            post_list, settings.COUNT_INDEX_POSTS, scope=scope
+        )
+        page = paginator.get_page(request.GET.get('page'))
+    thumbnails.prefetch(post.image for post in page)
+    return page
+
+
+def comment_page(comment_list, cursor):
+    """Очередная порция комментариев в порядке написания."""
+    paginator = CursorPaginator(
+        comment_list, settings.COMMENTS_PER_PAGE, ordering=('created', 'id')
+    )
+    return paginator.get_page(cursor)
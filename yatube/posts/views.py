@@ -1,24 +1,37 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db import IntegrityError, transaction
 from django.shortcuts import redirect, render, get_object_or_404
+from . import search, timeline
+from .cache import (
+    ALL, author_scope, cache_page_versioned, group_scope, group_scopes,
+    index_scopes, post_scopes, profile_scopes
+)
+from .conditional import (
+    conditional_page, group_state, index_state, post_state, profile_state
+)
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
-from .utils import page_list
+from .models import Post, Group, User, Follow, UserStats
+from .utils import comment_page, page_list
 
 
-@cache_page(20, key_prefix='index_page')
+@conditional_page(index_state)
+@cache_page_versioned('index_page', index_scopes)
 def index(request):
     """Главная страница."""
     post_list = Post.objects.select_related('author', 'group')
-    page_obj = page_list(post_list, request)
+    page_obj = page_list(post_list, request, ALL)
     return render(request, 'posts/index.html', {'page_obj': page_obj})
 
 
+@conditional_page(group_state)
+@cache_page_versioned('group_page', group_scopes)
 def group_posts(request, slug):
     """вывод записей одной из групп. """
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author', 'group')
-    page_obj = page_list(posts, request)
+    page_obj = page_list(posts, request, group_scope(group.pk))
     return render(
         request,
         'posts/group_list.html',
@@ -26,39 +39,76 @@ def group_posts(request, slug):
     )
 
 
+@conditional_page(profile_state)
+@cache_page_versioned('profile_page', profile_scopes)
 def profile(request, username):
     """вывод списка всех записей пользователя. """
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.select_related('author', 'group')
-    page_obj = page_list(post_list, request)
-    following = (
-        request.user.is_authenticated
-        and Follow.objects.filter(user=request.user, author=user).exists()
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
     )
+    post_list = user.posts.select_related('author', 'group')
+    page_obj = page_list(post_list, request, author_scope(user.pk))
     return render(request, 'posts/profile.html', {
         'author': user,
+        'stats': UserStats.objects.for_user(user),
         'page_obj': page_obj,
-        'following': following,
     })
 
 
+def post_search(request):
+    """поиск по тексту записей, группам и авторам. """
+    query = request.GET.get('q', '').strip()
+    post_list = search.filter_posts(
+        Post.objects.select_related('author', 'group'), query
+    )
+    page_obj = page_list(post_list, request)
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': page_obj,
+        # параметры, которые ссылки пагинатора сохраняют
+        'page_params': urlencode({'q': query}) + '&',
+    })
+
+
+@conditional_page(post_state)
+@cache_page_versioned('post_page', post_scopes)
 def post_detail(request, post_id):
     """подробная информация о записи. """
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'author__stats', 'group'),
+        pk=post_id
+    )
     form_comment = CommentForm(request.POST or None)
     return render(
         request,
         'posts/post_detail.html',
         {'post_detail': post,
+         'author_stats': UserStats.objects.for_user(post.author),
+         'comments': comment_page(
+             post.comments.select_related('author'), None
+         ),
          'form': form_comment,
          }
     )
 
 
+def comment_list(request, post_id):
+    """следующая порция комментариев к записи (HTML-фрагмент). """
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    comments = comment_page(
+        post.comments.select_related('author'), request.GET.get('cursor')
+    )
+    return render(
+        request,
+        'includes/comment_list.html',
+        {'post_detail': post, 'comments': comments}
+    )
+
+
 @login_required
 def post_create(request):
     """добавление новой записи в базу. """
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if not request.method == 'POST' or not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
@@ -114,7 +164,7 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = timeline.feed(request.user).select_related('author', 'group')
     page_obj = page_list(post_list, request)
     return render(request, 'posts/follow.html', {'page_obj': page_obj})
 
@@ -123,9 +173,13 @@ def follow_index(request):
 def profile_follow(request, username):
     """Подписаться на автора"""
     author = get_object_or_404(User, username=username)
-    subscription = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not subscription.exists():
-        Follow.objects.create(user=request.user, author=author)
+    if request.user != author:
+        # Один INSERT: повторную подписку отсекает уникальный индекс
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect('posts:profile', username=username)
 
 
@@ -133,7 +187,5 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """отписка от автора"""
     followed = get_object_or_404(User, username=username)
-    follow_qs = Follow.objects.filter(user=request.user, author=followed)
-    if follow_qs.exists():
-        follow_qs.delete()
+    Follow.objects.filter(user=request.user, author=followed).delete()
     return redirect('posts:profile', username=username)
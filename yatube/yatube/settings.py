@@ -1,4 +1,5 @@
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -31,6 +32,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым: замеры охватывают и запросы остальных middleware
+    'core.middleware.QueryMetricsMiddleware',
+    'core.profiling.SamplingProfilerMiddleware',
+    # до сессий: после записи сессии тоже читать из основной базы
+    'core.db.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -44,7 +50,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки (core.middleware)
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         # Добавлено: Искать шаблоны на уровне проекта
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
@@ -62,16 +69,71 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Стандартные бэкенды заменяются обёртками из core.db.backends: проверка
+# постоянных соединений и пул соединений процесса (core.db.pool)
+DB_BACKENDS = {
+    'django.db.backends.postgresql': 'core.db.backends.postgresql',
+    'django.db.backends.sqlite3': 'core.db.backends.sqlite3',
+}
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.postgresql')
 DATABASES = {
     'default': {
-	'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
+	'ENGINE': DB_BACKENDS.get(DB_ENGINE, DB_ENGINE),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # сколько секунд держать соединение между ответами (0 — закрывать
+        # после каждого ответа) и проверять ли его перед повторным
+        # использованием (как и в Django, по умолчанию не проверяется).
+        # Фоновые потоки (миниатюры, замеры) закрывают свои соединения
+        # сами: request_finished до них не доходит
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '0') == '1',
+        # пул соединений процесса, выключен при DB_POOL_SIZE=0
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', 0)),
+            'MIN': int(os.getenv('DB_POOL_MIN', 0)),
+            'IDLE_TIMEOUT': float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        },
     }
 }
+# Реплики для чтения (core.db.routers): через запятую host[:port] или,
+# для sqlite3, пути к файлам. GET-запросы к DB_REPLICA_VIEWS читают из
+# случайной реплики; после записи посетитель DB_REPLICA_STICKY_SECONDS
+# секунд читает из основной базы
+DB_REPLICAS = [
+    replica for replica in os.getenv('DB_REPLICAS', '').split(',') if replica
+]
+DATABASE_REPLICAS = []
+for number, replica in enumerate(DB_REPLICAS, 1):
+    if DB_ENGINE.endswith('sqlite3'):
+        location = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host, 'PORT': port or os.getenv('DB_PORT')}
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+DB_REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+)
+DB_REPLICA_STICKY_COOKIE = 'primary_reads'
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 15))
+# Сколько секунд живёт в кеше страница, собранная по реплике
+DB_REPLICA_PAGE_CACHE_TIMEOUT = int(
+    os.getenv('DB_REPLICA_PAGE_CACHE_TIMEOUT', 10)
+)
+# Записи этих приложений не переключают посетителя на основную базу
+DB_REPLICA_UNTRACKED_APPS = ('thumbnail', 'sessions')
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -99,6 +161,28 @@ STATIC_URL = '/static/'
 # Количество выводимых постов на странице
 COUNT_INDEX_POSTS = os.environ.get('COUNT_INDEX_POSTS', 10)
 COUNT_GROUP_POSTS = os.environ.get('COUNT_GROUP_POSTS', 10)
+# Количество комментариев в одной порции на странице записи
+COMMENTS_PER_PAGE = os.environ.get('COMMENTS_PER_PAGE', 20)
+# Число записей ленты для пагинатора берётся из кеша и пересчитывается
+# после изменения ленты или по истечении этого времени
+PAGINATOR_COUNT_TIMEOUT = int(os.getenv('PAGINATOR_COUNT_TIMEOUT', 60 * 15))
+# Сколько номеров страниц показывать по обе стороны от текущей
+PAGINATOR_ON_EACH_SIDE = int(os.getenv('PAGINATOR_ON_EACH_SIDE', 3))
+# Ленты с курсорной пагинацией (?cursor=) вместо номеров страниц,
+# например: CURSOR_PAGINATION_VIEWS=posts:index,posts:follow_index
+CURSOR_PAGINATION_VIEWS = [
+    name for name in os.environ.get('CURSOR_PAGINATION_VIEWS', '').split(',')
+    if name
+]
+# Лента подписок: авторы, у которых подписчиков не меньше порога или
+# записей больше, чем копируется в ленту при подписке, не раскладываются
+# по лентам при публикации, а подтягиваются при чтении
+TIMELINE_CELEBRITY_FOLLOWERS = int(
+    os.environ.get('TIMELINE_CELEBRITY_FOLLOWERS', 1000)
+)
+TIMELINE_BACKFILL_POSTS = int(os.environ.get('TIMELINE_BACKFILL_POSTS', 1000))
+# Обратно к раскладке автор переходит, опустившись ниже этой доли порогов
+TIMELINE_HYSTERESIS = float(os.environ.get('TIMELINE_HYSTERESIS', 0.8))
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -111,11 +195,116 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+# Страницы и счётчики поколений кеша должны быть общими для всех процессов,
+# поэтому по умолчанию кеш лежит в файлах в каталоге CACHE_LOCATION;
+# вместо него можно задать Redis-совместимый бэкенд, например
+# CACHE_BACKEND=django_redis.cache.RedisCache с CACHE_LOCATION=redis://...
+# В тестах по умолчанию кеш в памяти процесса
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache' if TESTING
+            else 'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            '' if TESTING else os.path.join(BASE_DIR, 'cache')
+        ),
+        'OPTIONS': {
+            # сверх этого числа записей кеш удаляет треть старых
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
     }
 }
+# Время жизни страниц лент и записей; устаревание по записи в базу
+# обеспечивают поколения в posts.cache
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 60 * 15))
+# Карточки записей кешируются по id и времени изменения записи
+CARD_CACHE_TIMEOUT = int(os.getenv('CARD_CACHE_TIMEOUT', 60 * 60 * 24))
+# Сколько секунд браузер и CDN могут не перепроверять ленты и записи
+# у анонимов; перепроверка обычно заканчивается ответом 304
+HTML_CACHE_MAX_AGE = int(os.getenv('HTML_CACHE_MAX_AGE', 0))
+# Миниатюры готовятся в фоновом пуле потоков, запрос их не ждёт;
+# THUMBNAIL_WORKERS=0 — готовить сразу, в том же потоке (по умолчанию
+# в тестах: фоновые потоки упираются в блокировки тестовой базы SQLite)
+THUMBNAIL_BACKEND = 'posts.thumbnails.AsyncThumbnailBackend'
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 0 if TESTING else 2))
+# Размеры, которые готовятся заранее при сохранении записи
+# (должны совпадать с {% thumbnail %} в шаблонах)
+THUMBNAIL_SIZES = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+# Адаптивные варианты картинок для srcset (posts.images): ширины,
+# пропорции кадра, атрибут sizes и качество; WebP и AVIF добавляются,
+# если их поддерживает установленный Pillow
+IMAGE_VARIANT_WIDTHS = [480, 960, 1440]
+IMAGE_VARIANT_ASPECT = (960, 339)
+IMAGE_VARIANT_SIZES = '(min-width: 768px) 75vw, 100vw'
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+# Загрузки пишутся на диск по частям; картинки записей проверяются
+# по размеру файла и заголовку, уменьшаются и перекодируются без EXIF
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedFileUploadHandler']
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 2 ** 20))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv('IMAGE_UPLOAD_MAX_PIXELS', 50_000_000))
+IMAGE_UPLOAD_MAX_DIMENSION = int(os.getenv('IMAGE_UPLOAD_MAX_DIMENSION', 2560))
+IMAGE_UPLOAD_FORMATS = ['JPEG', 'PNG', 'GIF', 'WEBP']
+IMAGE_UPLOAD_QUALITY = int(os.getenv('IMAGE_UPLOAD_QUALITY', 85))
+# gc_media не трогает файлы, которые изменялись позже (секунды):
+# загрузка сохраняется на диск раньше, чем запись в базу
+MEDIA_GC_GRACE = int(os.getenv('MEDIA_GC_GRACE', 60 * 60 * 24))
+# Конфигурация текстового поиска PostgreSQL (стемминг) для posts.search
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+# Замеры запросов к базе и шаблонов (core.middleware): JSON-строка в лог
+# yatube.metrics на каждый ответ (уровень INFO: METRICS_LOG_LEVEL=INFO)
+# и, при SERVER_TIMING=1, заголовок Server-Timing — он раскрывает
+# внутренние замеры, поэтому по умолчанию выключен
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
+# Бюджеты запросов к базе на ответ по имени представления, с запросами
+# сессии и пользователя; превышение пишется в лог или, при
+# QUERY_BUDGET_MODE=raise (по умолчанию в тестах), поднимает исключение
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 7,
+    'posts:profile': 8,
+    'posts:post_detail': 7,
+    'posts:follow_index': 6,
+    'posts:search': 6,
+}
+QUERY_BUDGET_MODE = os.getenv(
+    'QUERY_BUDGET_MODE', 'raise' if TESTING else 'log'
+)
+# Метрики для Prometheus (core.metrics) на /metrics: доступ по заголовку
+# Authorization: Bearer <METRICS_TOKEN> или сотрудникам. При нескольких
+# процессах gunicorn задайте общий для машины каталог METRICS_DIR:
+# процессы пишут туда свои значения раз в METRICS_FLUSH_INTERVAL секунд
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# Профилирование (core.profiling), включается PROFILER_ENABLED=1: отчёт
+# сохраняется для запросов дольше PROFILER_SLOW_MS и для доли
+# PROFILER_SAMPLE_RATE запросов, которые выполняются под cProfile
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '0') == '1'
+PROFILER_SLOW_MS = float(os.getenv('PROFILER_SLOW_MS', 500))
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 5))
+PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILER_MAX_DUMPS = int(os.getenv('PROFILER_MAX_DUMPS', 200))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
 
 STATIC_URL = '/static/' # префикс для url
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/') # папка, в которой будет лежать статика